@@ -81,7 +81,9 @@ export const bookAppointment = (data) => {
         status: 'ok',
         booking_id: `demo-booking-${Math.random().toString(36).substr(2, 9)}`,
         payload: data,
-        email: { ok: true }
+        email: { ok: null, queued: true },
+        next_message: `Your appointment has been confirmed! A confirmation email is on its way.\n\nDoctor: ${data.doctor}\nDate:   ${data.date}\nTime:   ${data.start} – ${data.end}`,
+        data: { doctor: data.doctor, appointment_date: data.date, appointment_start: data.start, appointment_end: data.end }
       }
     });
   }
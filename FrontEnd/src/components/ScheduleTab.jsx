@@ -19,6 +19,7 @@ export default function ScheduleTab({ onBooked }) {
   const [slotsLoading, setSlotsLoading] = useState(false);
   const [booking, setBooking] = useState(false);
   const [success, setSuccess] = useState(null);
+  const [confirmation, setConfirmation] = useState('');
   const [error, setError] = useState('');
   const [step, setStep] = useState(1); // 1=doctor+date, 2=slot+reason, 3=confirm
 
@@ -50,6 +51,7 @@ export default function ScheduleTab({ onBooked }) {
       };
       const { data } = await bookAppointment(payload);
       setSuccess(data.booking_id);
+      setConfirmation(data.next_message || '');
       setStep(3);
     } catch (e) {
       setError(e.response?.data?.detail || e.response?.data?.error || 'Booking failed.');
@@ -61,7 +63,9 @@ export default function ScheduleTab({ onBooked }) {
       <div style={{ fontSize: 64, marginBottom: 16 }}>✅</div>
       <h2 style={{ color: 'white', fontWeight: 700, fontSize: '1.5rem', marginBottom: 8 }}>Appointment Booked!</h2>
       <p style={{ color: 'rgba(255,255,255,0.5)', marginBottom: 8 }}>Booking ID: <span style={{ color: '#38bdf8' }}>{success}</span></p>
-      <p style={{ color: 'rgba(255,255,255,0.4)', fontSize: '0.875rem', marginBottom: 24 }}>A confirmation email has been sent to {user?.email}</p>
+      <p style={{ color: 'rgba(255,255,255,0.4)', fontSize: '0.875rem', marginBottom: 24, whiteSpace: 'pre-line' }}>
+        {confirmation || `A confirmation email is on its way to ${user?.email}`}
+      </p>
       <button onClick={onBooked} style={{
         padding: '0.75rem 2rem', borderRadius: 12,
         background: 'linear-gradient(135deg,#0ea5e9,#6366f1)',
@@ -1,227 +1,310 @@
+import hashlib
+import logging
+import os
 import re
-from typing import Any, Dict, Optional
-from .schema import IntakeState, PatientIntake
-# from .config import LLM_MODEL
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+from .schema import IntakeState, PatientIntakeCore, age_from_dob
+from .llm import LLM_SLOTS, get_extract_chain
 
 # EMAIL_RE = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.I)
-DOB_RE = re.compile(r"\b\d{2}-\d{2}-(19|20)\d{2}\b")
 # NAME_RE = re.compile(r"\bmy name is\s+([A-Za-z][A-Za-z .'-]{1,60})", re.I)
 DR_RE = re.compile(r"\bDr\.?\s+[A-Z][a-zA-Z.-]{1,40}\b")
 
-def safe_json_loads(text: str) -> Dict[str, Any]:
-    text = text.strip()
-    try:
-        import json
-        return json.loads(text)
-    except Exception:
-        pass
-    if "```" in text:
-        for part in text.split("```"):
-            try:
-                return json.loads(part.strip())
-            except Exception:
-                continue
-    start = text.find("{"); end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        try:
-            import json
-            return json.loads(text[start:end+1])
-        except Exception:
-            return {}
-    return {}
-
-def infer_inline_updates(user_text: str, context_step: Optional[str]) -> dict:
-    """
-    Context-aware mapper. The same reply like 'no' maps differently depending on the question.
-    """
-    d = {}
-    t = (user_text or "").strip()
-    low = t.lower()
+# DOB + doctor fallbacks scanned in one pass; the caller applies priority.
+_FALLBACK_RE = re.compile(
+    r"(?P<dob>\b\d{2}-\d{2}-(?:19|20)\d{2}\b)|(?P<dr>\bDr\.?\s+[A-Z][a-zA-Z.-]{1,40}\b)"
+)
 
-    # ---------- Context-specific first ----------
-    if context_step == "ask_doctor":
-        if low in {"any", "any doctor", "no", "none", "na"}:
-            d["doctor"] = "any doctor"; return d
-        m = DR_RE.search(t)
-        if m:
-            doc = m.group(0)
-            if not doc.lower().startswith("dr."):
-                doc = doc.replace("Dr", "Dr.")
-            d["doctor"] = doc.strip(); return d
-
-    if context_step == "ask_returning":
-        if low in {"yes", "y", "yeah", "yep", "visited", "i have"}:
-            d["_yes_no"] = True; return d
-        if low in {"no", "n", "new", "first time"}:
-            d["_yes_no"] = False; return d
-
-    if context_step == "ask_date":
-        if re.fullmatch(r"\d{4}-\d{2}-\d{2}", t):
-            d["appointment_date"] = t; return d
-
-    # if context_step == "ask_email":
-    #     m = EMAIL_RE.search(t)
-    #     if m: d["email"] = m.group(0); return d
-
-    # if context_step == "ask_phone":
-    #     digits = re.sub(r"[^\d+]", "", t)
-    #     if len(re.sub(r"\D", "", digits)) >= 10:
-    #         d["phone"] = digits; return d
-
-    if context_step == "ask_insurance_carrier":
-        # Negative → self-pay
-        if low in {"no", "none", "no insurance", "self pay", "self-pay"}:
-            d["insurance_carrier"] = "self-pay"
-            d["insurance_member_id"] = ""
-            d["insurance_group"] = ""
-            return d
-        # Positive → allow "yes <carrier> <member> <group>"
-        parts = t.split()
-        if parts and parts[0].lower() == "yes":
-            parts = parts[1:]
-        if len(parts) >= 1: d["insurance_carrier"] = parts[0]
-        if len(parts) >= 2: d["insurance_member_id"] = parts[1]
-        if len(parts) >= 3: d["insurance_group"] = parts[2]
-        if any(k in d for k in ("insurance_carrier", "insurance_member_id", "insurance_group")):
-            return d
-
-    if context_step == "ask_insurance_member_id":
-        if low in {"no", "none"}:
-            d["insurance_member_id"] = ""; return d
-        d["insurance_member_id"] = t; return d
-
-    if context_step == "ask_insurance_group":
-        if low in {"no", "none"}:
-            d["insurance_group"] = ""; return d
-        d["insurance_group"] = t; return d
-
-    if context_step == "ask_problem":
-        # short, clean label
-        symptom_map = {
-            "coughing": "cough",
-            "cough": "cough",
-            "fever": "fever",
-            "allergy": "allergies",
-            "allergies": "allergies",
-            "tooth": "tooth pain",
-            "toothache": "tooth pain",
-            "headache": "headache",
-            "cold": "cold",
-            "pain": "pain",
-        }
-        label = None
-        for k, v in symptom_map.items():
-            if k in low:
-                label = v; break
-        d["problem"] = label or (t[:50] if len(t) > 50 else t)
-        return d
-
-    if context_step == "ask_problem_details":
-        d["problem_description"] = t.strip().rstrip(".") + "."
-        return d
-
-    # ---------- Context-agnostic fallbacks ----------
+# keyword → clean label; earlier keys win when several appear
+SYMPTOM_MAP = {
+    "coughing": "cough",
+    "cough": "cough",
+    "fever": "fever",
+    "allergy": "allergies",
+    "allergies": "allergies",
+    "tooth": "tooth pain",
+    "toothache": "tooth pain",
+    "headache": "headache",
+    "cold": "cold",
+    "pain": "pain",
+}
+
+def _match_symptom(low: str) -> Optional[str]:
+    """Return the label of the highest-priority symptom keyword in `low`."""
+    for k, label in SYMPTOM_MAP.items():
+        if k in low:
+            return label
+    return None
+
+_ANY_DOCTOR = frozenset({"any", "any doctor", "no", "none", "na"})
+_SELF_PAY = frozenset({"no", "none", "no insurance", "self pay", "self-pay"})
+_NONE_WORDS = frozenset({"no", "none"})
+
+def _normalize_dr(doc: str) -> str:
+    if not doc.lower().startswith("dr."):
+        doc = doc.replace("Dr", "Dr.")
+    return doc.strip()
+
+# ---------- Context-specific handlers ----------
+# Each takes (t, low) and returns the updates, or None to fall through
+# to the context-agnostic fallbacks.
+
+def _h_doctor(t: str, low: str) -> Optional[dict]:
+    if low in _ANY_DOCTOR:
+        return {"doctor": "any doctor"}
+    m = DR_RE.search(t) if "Dr" in t else None
+    if m:
+        return {"doctor": _normalize_dr(m.group(0))}
+    return None
+
+_YES_WORDS = frozenset({"yes", "y", "yeah", "yep", "visited", "i have"})
+_NO_WORDS = frozenset({"no", "n", "new", "first time"})
+
+def _h_returning(t: str, low: str) -> Optional[dict]:
+    tok = low.strip(" .!?,;")
+    if tok in _YES_WORDS:
+        return {"_yes_no": True}
+    if tok in _NO_WORDS:
+        return {"_yes_no": False}
+    return None
+
+def _is_iso_date(t: str) -> bool:
+    """YYYY-MM-DD shape check; same as fullmatch(r"\d{4}-\d{2}-\d{2}") without the regex engine."""
+    return (
+        len(t) == 10 and t[4] == "-" and t[7] == "-"
+        and t[:4].isdecimal() and t[5:7].isdecimal() and t[8:].isdecimal()
+    )
+
+def _h_date(t: str, low: str) -> Optional[dict]:
+    if _is_iso_date(t):
+        return {"appointment_date": t}
+    return None
+
+# def _h_email(t: str, low: str) -> Optional[dict]:
+#     m = EMAIL_RE.search(t)
+#     return {"email": m.group(0)} if m else None
+
+# def _h_phone(t: str, low: str) -> Optional[dict]:
+#     digits = re.sub(r"[^\d+]", "", t)
+#     if len(re.sub(r"\D", "", digits)) >= 10:
+#         return {"phone": digits}
+#     return None
+
+def _h_insurance_carrier(t: str, low: str) -> Optional[dict]:
+    # Negative → self-pay
+    if low in _SELF_PAY:
+        return {"insurance_carrier": "self-pay", "insurance_member_id": "", "insurance_group": ""}
+    # Positive → allow "yes <carrier> <member> <group>"
+    parts = t.split()
+    if parts and parts[0].lower() == "yes":
+        parts = parts[1:]
+    if not parts:
+        return None
+    keys = ("insurance_carrier", "insurance_member_id", "insurance_group")
+    return dict(zip(keys, parts))
+
+def _h_insurance_member_id(t: str, low: str) -> dict:
+    return {"insurance_member_id": "" if low in _NONE_WORDS else t}
+
+def _h_insurance_group(t: str, low: str) -> dict:
+    return {"insurance_group": "" if low in _NONE_WORDS else t}
+
+def _h_problem(t: str, low: str) -> dict:
+    # short, clean label
+    label = _match_symptom(low)
+    return {"problem": label or (t[:50] if len(t) > 50 else t)}
+
+def _h_problem_details(t: str, low: str) -> dict:
+    return {"problem_description": t.strip().rstrip(".") + "."}
+
+_HANDLERS: Dict[str, Callable[[str, str], Optional[dict]]] = {
+    "ask_doctor": _h_doctor,
+    "ask_returning": _h_returning,
+    "ask_date": _h_date,
+    # "ask_email": _h_email,
+    # "ask_phone": _h_phone,
+    "ask_insurance_carrier": _h_insurance_carrier,
+    "ask_insurance_member_id": _h_insurance_member_id,
+    "ask_insurance_group": _h_insurance_group,
+    "ask_problem": _h_problem,
+    "ask_problem_details": _h_problem_details,
+}
+
+# ---------- Context-agnostic fallbacks ----------
+
+def _fallback(t: str, low: str) -> dict:
     # m = EMAIL_RE.search(t)
-    # if m: d["email"] = m.group(0); return d
+    # if m: return {"email": m.group(0)}
 
     # digits = re.sub(r"[^\d+]", "", t)
     # if len(re.sub(r"\D", "", digits)) >= 10:
-    #     d["phone"] = digits; return d
-
-    m = DOB_RE.search(t)
-    if m: d["dob"] = m.group(0); return d
+    #     return {"phone": digits}
+
+    dob = dr = None
+    # literal prefilter: a DOB needs "-" and a doctor needs "Dr"
+    if "-" in t or "Dr" in t:
+        for m in _FALLBACK_RE.finditer(t):
+            if m.lastgroup == "dob":
+                dob = m.group(0); break
+            if dr is None:
+                dr = m.group(0)
+    if dob:
+        return {"dob": dob}
 
     # m = NAME_RE.search(t)
-    # if m: d["name"] = m.group(1).strip(); return d
+    # if m: return {"name": m.group(1).strip()}
 
-    if low in {"any", "any doctor", "no", "none", "na"}:
-        d["doctor"] = "any doctor"; return d
+    if low in _ANY_DOCTOR:
+        return {"doctor": "any doctor"}
 
-    m = DR_RE.search(t)
-    if m:
-        doc = m.group(0)
-        if not doc.lower().startswith("dr."):
-            doc = doc.replace("Dr", "Dr.")
-        d["doctor"] = doc.strip(); return d
+    if dr:
+        return {"doctor": _normalize_dr(dr)}
 
     # symptom heuristic (only set clean label here)
-    if any(w in low for w in ["fever","allergy","allergies","toothache","tooth","pain","cough","coughing","cold","headache"]):
-        symptom_map = {
-            "coughing": "cough",
-            "cough": "cough",
-            "fever": "fever",
-            "allergy": "allergies",
-            "allergies": "allergies",
-            "toothache": "tooth pain",
-            "tooth": "tooth pain",
-            "headache": "headache",
-            "cold": "cold",
-            "pain": "pain",
-        }
-        for k, v in symptom_map.items():
-            if k in low:
-                d["problem"] = v; break
-        # Don't set description here to avoid capturing greetings as description
-        return d
-
+    # Don't set description here to avoid capturing greetings as description
+    label = _match_symptom(low)
+    if label:
+        return {"problem": label}
 
     # date outside ask_date → treat as DOB
-    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", t):
-        d["dob"] = t; return d
-
-    return d
-
-extract_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", """Return ONLY JSON with keys:
-dob, doctor, location, problem, problem_description,
-insurance_carrier, insurance_member_id, insurance_group."""),
-        ("human", "User input:\n{input_text}"),
-    ]
-)
-_llm = ChatOpenAI(model="o4-mini-2025-04-16")
-extract_chain = extract_prompt | _llm | StrOutputParser()
+    if _is_iso_date(t):
+        return {"dob": t}
+
+    return {}
+
+def _parse_inline_uncached(context_step: Optional[str], t: str) -> Tuple[Tuple[str, Any], ...]:
+    """Core of infer_inline_updates; returns hashable items."""
+    if not t:
+        return ()
+    low = t.lower()
+
+    h = _HANDLERS.get(context_step)
+    if h:
+        d = h(t, low)
+        if d is not None:
+            return tuple(d.items())
+    return tuple(_fallback(t, low).items())
+
+# Only the fixed-answer steps are memoized: their replies repeat across
+# patients ("yes", "any doctor", a date). Free-text steps (problem details,
+# insurance ids, ...) carry patient data and are never kept in the cache.
+_CACHED_STEPS = frozenset({"ask_returning", "ask_doctor", "ask_date"})
+_CACHED_MAX_LEN = 40
+_parse_inline_cached = lru_cache(maxsize=4096)(_parse_inline_uncached)
+
+def _parse_inline(context_step: Optional[str], t: str) -> Tuple[Tuple[str, Any], ...]:
+    if context_step in _CACHED_STEPS and len(t) <= _CACHED_MAX_LEN:
+        return _parse_inline_cached(context_step, t)
+    return _parse_inline_uncached(context_step, t)
+
+def infer_inline_updates(user_text: str, context_step: Optional[str]) -> dict:
+    """
+    Context-aware mapper. The same reply like 'no' maps differently depending on the question.
+    """
+    return dict(_parse_inline(context_step, (user_text or "").strip()))
+
+# Inline key that fully answers each question step. When the inline
+# parser already produced it, the LLM call is skipped for that turn.
+_STEP_FIELDS = {
+    "ask_problem": "problem",
+    "ask_problem_details": "problem_description",
+    "ask_returning": "_yes_no",
+    "ask_doctor": "doctor",
+    "ask_date": "appointment_date",
+    "ask_insurance_carrier": "insurance_carrier",
+    "ask_insurance_member_id": "insurance_member_id",
+    "ask_insurance_group": "insurance_group",
+}
+
+# LLM keys ignored at each step. Guards: only accept a description when we
+# asked for it, and don't let the LLM set DOB when we asked for a date.
+_NO_DESCRIPTION = frozenset({"problem_description"})
+_LLM_GUARDED = {
+    "ask_problem_details": frozenset(),
+    "ask_date": frozenset({"problem_description", "dob"}),
+}
+_MISSING = object()
+# current values an LLM field may fill (hash lookup instead of == scans)
+_UNSET = frozenset({None, "", False})
+
+# LLM extraction results by message. Keys are a salted blake2b of the text
+# (salt is per process), so the raw message itself is not kept. Values are
+# the extracted PatientIntakeCore fields only, which still include patient
+# data (dob, problem_description, insurance ids); the cache is bounded and
+# lives only in this process.
+# Text is not case-folded: descriptions are extracted verbatim.
+_LLM_CACHE_SIZE = 1024
+_LLM_CACHE_SALT = os.urandom(16)
+_LLM_CACHE: "OrderedDict[bytes, Tuple[Tuple[str, Any], ...]]" = OrderedDict()
+_LLM_CACHE_LOCK = threading.Lock()
+
+def _llm_extract(user_text: str) -> Tuple[Tuple[str, Any], ...]:
+    """
+    Memoized LLM extraction: a retried or repeated message reuses the
+    previous result instead of another round trip. Returns hashable items.
+    """
+    key = hashlib.blake2b(user_text.encode(), key=_LLM_CACHE_SALT, digest_size=16).digest()
+    with _LLM_CACHE_LOCK:
+        hit = _LLM_CACHE.get(key)
+        if hit is not None:
+            _LLM_CACHE.move_to_end(key)
+            return hit
+    with LLM_SLOTS:
+        result = get_extract_chain().invoke({"input_text": user_text}).model_dump()
+    # keep only fields node_extract can apply; drop anything else the schema returns
+    items = tuple((k, v) for k, v in result.items() if hasattr(PatientIntakeCore, k))
+    with _LLM_CACHE_LOCK:
+        _LLM_CACHE[key] = items
+        if len(_LLM_CACHE) > _LLM_CACHE_SIZE:
+            _LLM_CACHE.popitem(last=False)
+    return items
 
 def node_extract(state: IntakeState) -> IntakeState:
-    user_text = state.get("input_text", "") or ""
+    user_text = (state.get("input_text", "") or "").strip()
     context_step = state.get("next_step")
-    patient: PatientIntake = state.get("patient") or PatientIntake()
+    patient: PatientIntakeCore = state.get("patient") or PatientIntakeCore()
 
     # 1) inline with context
-    inline = infer_inline_updates(user_text, context_step)
-
-    # Special key: _yes_no → maps to returning_patient
-    if "_yes_no" in inline:
-        patient.returning_patient = inline.pop("_yes_no")
-
-    for k, v in inline.items():
-        if v is not None and hasattr(patient, k):
+    # (read the parsed items directly — no per-turn dict to copy or pop)
+    step_field = _STEP_FIELDS.get(context_step)
+    answered = False
+    for k, v in _parse_inline(context_step, user_text):
+        if k == step_field:
+            answered = True
+        # Special key: _yes_no → maps to returning_patient
+        if k == "_yes_no":
+            patient.returning_patient = v
+        elif v is not None and hasattr(patient, k):
             setattr(patient, k, v)
 
-    # 2) LLM extraction (for rich inputs)
-    raw = extract_chain.invoke({"input_text": user_text})
-    data = safe_json_loads(raw)
-
-    # Guard: only accept description when we asked for it
-    if "problem_description" in data and context_step != "ask_problem_details":
-        data.pop("problem_description", None)
-    # Guard: if we asked for date, don't let LLM set DOB
-    if context_step == "ask_date" and "dob" in data:
-        data.pop("dob", None)
-
-    # merge but don't overwrite existing non-empty values
-    for k, v in data.items():
-        if not hasattr(patient, k):
-            continue
-        if isinstance(v, str) and not v.strip():
-            continue
-        if getattr(patient, k, None) in (None, "", False):
-            setattr(patient, k, v)
+    # 2) LLM extraction (for rich inputs) — only when the inline
+    #    parser did not already answer the question we asked, and never
+    #    for a blank message
+    if not answered and user_text:
+        skip = _LLM_GUARDED.get(context_step, _NO_DESCRIPTION)
+        try:
+            llm_items = _llm_extract(user_text)
+        except Exception:
+            # keep the inline results; a failed call is not cached, so a retry re-asks
+            logging.getLogger("medical_api").exception("node_extract: LLM extraction failed")
+            llm_items = ()
+
+        # merge but don't overwrite existing non-empty values
+        # (one pass over the memoized items; guarded keys are skipped)
+        for k, v in llm_items:
+            if k in skip:
+                continue
+            if isinstance(v, str) and not v.strip():
+                continue
+            if getattr(patient, k, _MISSING) in _UNSET:
+                setattr(patient, k, v)
 
-    state["patient"] = PatientIntake(**patient.model_dump())
-    state["_inline"] = inline
-    return state
+    # derive age in place instead of re-validating the whole model
+    if patient.age is None and patient.dob:
+        patient.age = age_from_dob(patient.dob)
 
+    state["patient"] = patient
+    return state
@@ -2,27 +2,26 @@
 
 from __future__ import annotations
 
-from langgraph.graph import (
-    StateGraph,
-    START,
-    END,
-)
+import asyncio
+from typing import Any, Optional
 
-from .schema import IntakeState
+from .schema import IntakeState, from_core, to_core
 
 from .extract import node_extract
 
 from .nodes import (
-    node_ensure_problem,
-    node_ensure_returning,
-    node_ensure_doctor,
-    node_ensure_date,
+    has_missing_fields,
+    node_ensure_fields,
     node_fetch_slots,
     node_book_appointment,
     node_await_slot_selection,
 )
 
 
+# Terminal marker returned by the routers (same value as langgraph's END).
+END = "__end__"
+
+
 # =========================================================
 # ROUTING HELPERS
 # =========================================================
@@ -56,33 +55,18 @@ def _route_from_start(state: IntakeState) -> str:
 
 def _route_after_extract(state: IntakeState) -> str:
     """
-    After extraction, route to whichever piece of information is
-    still missing, in order of priority.
+    After extraction, ask for whatever is still missing (FIELD_PROMPTS
+    order in nodes.py), otherwise move on to slots.
 
     Full happy path:
-      extract → ensure_problem
-              → ensure_returning
-              → ensure_doctor
-              → ensure_date
-              → fetch_slots          ← sets next_step='select_slot', END
+      extract → ensure_fields       ← asks the first missing field, END
+      (next requests, until nothing is missing)
+      extract → fetch_slots         ← sets next_step='select_slot', END
       (next request)
-              → book_appointment     ← selected_slot_id present, END
+              → book_appointment    ← selected_slot_id present, END
     """
-    p = state.get("patient")
-    if not p:
-        return "ensure_problem"
-
-    if not p.problem or not p.problem_description:
-        return "ensure_problem"
-
-    if p.returning_patient is None:
-        return "ensure_returning"
-
-    if not p.doctor:
-        return "ensure_doctor"
-
-    if not p.appointment_date:
-        return "ensure_date"
+    if has_missing_fields(state.get("patient")):
+        return "ensure_fields"
 
     # All required fields collected.
     # selected_slot_id check here is a safety net — normally the start
@@ -95,29 +79,12 @@ def _route_after_extract(state: IntakeState) -> str:
 
 def _route_after_ensure(state: IntakeState) -> str:
     """
-    After any ensure-* node, re-check whether that node set a message
-    (still waiting for user input) or whether we can move to the next check.
+    After ensure_fields: END if it asked a question (waiting for the
+    user), otherwise everything is collected and we continue.
     """
     if state.get("message"):
         return END  # waiting for user reply
 
-    p = state.get("patient")
-    if not p:
-        return END
-
-    if not p.problem or not p.problem_description:
-        return "ensure_problem"
-
-    if p.returning_patient is None:
-        return "ensure_returning"
-
-    if not p.doctor:
-        return "ensure_doctor"
-
-    if not p.appointment_date:
-        return "ensure_date"
-
-    # All fields present
     if state.get("selected_slot_id"):
         return "book_appointment"
 
@@ -125,99 +92,72 @@ def _route_after_ensure(state: IntakeState) -> str:
 
 
 # =========================================================
-# BUILD GRAPH
+# DIRECT RUNNER
 # =========================================================
 
-def _build_graph():
-
-    g = StateGraph(IntakeState)
-
-    # ----------------------------------------------------------
-    # Nodes
-    # ----------------------------------------------------------
-
-    g.add_node("extract",          node_extract)
-    g.add_node("ensure_problem",   node_ensure_problem)
-    g.add_node("ensure_returning", node_ensure_returning)
-    g.add_node("ensure_doctor",    node_ensure_doctor)
-    g.add_node("ensure_date",      node_ensure_date)
-    g.add_node("fetch_slots",      node_fetch_slots)
-    g.add_node("await_slot",       node_await_slot_selection)
-    g.add_node("book_appointment", node_book_appointment)
-
-    # ----------------------------------------------------------
-    # Entry point — check session phase BEFORE extract
-    # ----------------------------------------------------------
-
-    g.add_conditional_edges(
-        START,
-        _route_from_start,
-        {
-            "extract":          "extract",
-            "await_slot":       "await_slot",
-            "book_appointment": "book_appointment",
-        },
-    )
-
-    # ----------------------------------------------------------
-    # After extraction → route to first missing field or slots
-    # ----------------------------------------------------------
-
-    g.add_conditional_edges(
-        "extract",
-        _route_after_extract,
-        {
-            "ensure_problem":   "ensure_problem",
-            "ensure_returning": "ensure_returning",
-            "ensure_doctor":    "ensure_doctor",
-            "ensure_date":      "ensure_date",
-            "fetch_slots":      "fetch_slots",
-            "book_appointment": "book_appointment",
-        },
-    )
-
-    # ----------------------------------------------------------
-    # After each ensure node → next missing field or END
-    # ----------------------------------------------------------
-
-    _ensure_targets = {
-        "ensure_problem":   "ensure_problem",
-        "ensure_returning": "ensure_returning",
-        "ensure_doctor":    "ensure_doctor",
-        "ensure_date":      "ensure_date",
-        "fetch_slots":      "fetch_slots",
-        "book_appointment": "book_appointment",
-        END:                END,
-    }
-
-    for node_name in (
-        "ensure_problem",
-        "ensure_returning",
-        "ensure_doctor",
-        "ensure_date",
-    ):
-        g.add_conditional_edges(
-            node_name,
-            _route_after_ensure,
-            _ensure_targets,
-        )
+_NODES = {
+    "extract":          node_extract,
+    "ensure_fields":    node_ensure_fields,
+    "fetch_slots":      node_fetch_slots,
+    "await_slot":       node_await_slot_selection,
+    "book_appointment": node_book_appointment,
+}
 
-    # ----------------------------------------------------------
-    # Terminal edges
-    # fetch_slots → END   : frontend shows slots and waits
-    # await_slot  → END   : re-prompt, no DB hit, still waiting
-    # book_appointment → END : booking confirmed
-    # ----------------------------------------------------------
+# Nodes whose outgoing edge is conditional; every other node ends the turn.
+_ROUTERS = {
+    "extract":          _route_after_extract,
+    "ensure_fields":    _route_after_ensure,
+}
 
-    g.add_edge("fetch_slots",      END)
-    g.add_edge("await_slot",       END)
-    g.add_edge("book_appointment", END)
+# Same bound LangGraph applies by default (recursion_limit=25).
+_MAX_STEPS = 25
 
-    return g.compile()
+
+def run_intake(state: IntakeState) -> IntakeState:
+    """
+    Walk the intake nodes and routers, calling them directly. Every node
+    mutates and returns the full state, so no per-node channel
+    writes/merges are needed. The patient is carried as a PatientIntakeCore
+    inside the flow and converted back on the way out.
+
+    Works on a shallow copy: the caller's dict is never modified, even
+    when a node raises.
+    """
+    state = dict(state)
+    state["patient"] = to_core(state.get("patient"))
+    node = _route_from_start(state)
+    for _ in range(_MAX_STEPS):
+        state = _NODES[node](state)
+        router = _ROUTERS.get(node)
+        node = router(state) if router else END
+        if node == END:
+            state["patient"] = from_core(state["patient"])
+            return state
+    raise RecursionError(f"Intake flow exceeded {_MAX_STEPS} steps")
 
 
 # =========================================================
 # GRAPH INSTANCE
 # =========================================================
 
-intake_graph = _build_graph()
\ No newline at end of file
+class _IntakeRunner:
+    """
+    Stands in for the compiled LangGraph graph (no checkpointer is used).
+    Supports invoke/ainvoke; config is accepted and ignored. Anything else
+    (stream, checkpoint APIs) fails with a clear error.
+    """
+
+    def invoke(self, state: IntakeState, config: Optional[Any] = None, **_: Any) -> IntakeState:
+        return run_intake(state)
+
+    async def ainvoke(self, state: IntakeState, config: Optional[Any] = None, **_: Any) -> IntakeState:
+        return await asyncio.to_thread(run_intake, state)
+
+    def __getattr__(self, name: str) -> Any:
+        raise AttributeError(
+            f"intake_graph is a direct runner and has no {name!r}; "
+            "only invoke/ainvoke are supported"
+        )
+
+
+intake_graph = _IntakeRunner()
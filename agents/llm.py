@@ -1,31 +1,71 @@
 # agents/llm.py
 from __future__ import annotations
-from dotenv import load_dotenv
-from langchain.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+import logging
+import os
+import threading
+from functools import cache
 
-load_dotenv()
+import httpx
+from langchain_core.prompts import ChatPromptTemplate
+
+from . import config  # noqa: F401  loads .env once for the agents package
+from .schema import PatientIntakeExtract
 
 LLM_MODEL = "gpt-4o-mini"
 
+# Kept short and static: every token is billed per call, and an unchanging
+# prefix lets OpenAI's prompt caching reuse it across turns.
+EXTRACT_SYSTEM = (
+    'Extract the schema fields from the user input. Missing = "". '
+    'problem: short title (e.g. "tooth pain"). '
+    "problem_description: user's own wording. dob: YYYY-MM-DD."
+)
+
 extract_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", """You are a precise information extraction assistant.
-Return ONLY a compact JSON object with these keys:
-name, dob, doctor, location, problem, problem_description, email, phone,
-insurance_carrier, insurance_member_id, insurance_group.
-
-Rules:
-- Use empty string "" for any field not mentioned.
-- DO NOT add extra keys.
-- For "problem": a short title (e.g., "tooth pain").
-- For "problem_description": keep the user's wording (short but faithful).
-- DOB format must be YYYY-MM-DD if present, else "".
-- Never include commentary or markdown, ONLY JSON."""),
-        ("human", "User input:\n{input_text}"),
-    ]
+    [("system", EXTRACT_SYSTEM), ("human", "{input_text}")]
+)
+
+# One pooled HTTP/2 client for the whole process, so every LLM call reuses
+# the same keep-alive connection instead of paying a new TLS handshake.
+_http_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32),
+    timeout=30,
 )
 
-_llm = ChatOpenAI(model=LLM_MODEL, temperature=0)
-extract_chain = extract_prompt | _llm | StrOutputParser()
+def prewarm_http_client() -> None:
+    """
+    Open the TLS session to the API ahead of the first real request.
+    Called from the API server's startup, never at import, so scripts and
+    tests that import agents make no network calls. Best-effort.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return
+    base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    try:
+        _http_client.get(f"{base_url}/models", headers={"Authorization": f"Bearer {api_key}"})
+    except Exception as exc:
+        logging.getLogger("medical_api").warning("LLM client prewarm failed: %s", exc)
+
+# Caps in-flight LLM calls across all graph workers, so a burst of chat
+# turns queues here instead of tripping the provider's rate limit.
+MAX_CONCURRENT_LLM = int(os.getenv("MAX_CONCURRENT_LLM", "8"))
+LLM_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_LLM)
+
+@cache
+def get_extract_chain():
+    """
+    Single shared model + chain, built on first use so importing this module
+    doesn't pull in langchain_openai/openai. Never build another ChatOpenAI
+    elsewhere.
+
+    Structured output: the server constrains decoding to the schema, so the
+    chain returns a PatientIntakeExtract instead of text that needs repairing.
+    """
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(model=LLM_MODEL, temperature=0, http_client=_http_client)
+    return extract_prompt | llm.with_structured_output(
+        PatientIntakeExtract, method="json_schema"
+    )
@@ -3,9 +3,10 @@
 from __future__ import annotations
 from datetime import datetime
 
-from .schema import IntakeState, PatientIntake
+from .schema import IntakeState, PatientIntakeCore
 from .scheduler import assign_duration
 from .models import DoctorAvailability
+from api.services.notify import booking_confirmation_message
 
 
 # =========================================================
@@ -36,149 +37,95 @@ def node_await_slot_selection(
     return state
 
 # =========================================================
-# ENSURE PROBLEM
+# ENSURE REQUIRED FIELDS
 # =========================================================
 
-def node_ensure_problem(
-    state: IntakeState
-) -> IntakeState:
-    """
-    Ensure:
-    - problem
-    - problem_description
-    """
-
-    p: PatientIntake = state["patient"]
-
-    # -----------------------------------------
-    # Main issue
-    # -----------------------------------------
-
-    if not p.problem:
-
-        state["message"] = (
-            "What seems to be the problem today?"
-        )
-
-        state["next_step"] = "ask_problem"
-
-        return state
-
-    # -----------------------------------------
-    # Problem description
-    # -----------------------------------------
-
-    if not p.problem_description:
-
-        state["message"] = (
-            "Could you describe the symptoms in a bit more detail?"
-        )
-
-        state["next_step"] = "ask_problem_details"
+def _ask_date(p: PatientIntakeCore) -> str:
+    """Fix the appointment duration and ask for a date."""
 
-        return state
-
-    return state
-
-
-# =========================================================
-# ENSURE RETURNING PATIENT
-# =========================================================
-
-def node_ensure_returning(
-    state: IntakeState
-) -> IntakeState:
-    """
-    Determine whether patient is returning.
-    """
-
-    p: PatientIntake = state["patient"]
-
-    if p.returning_patient is None:
-
-        state["message"] = (
-            "Have you visited us before? (yes/no)"
+    mins = (
+        p.appointment_duration_min
+        or assign_duration(
+            p.returning_patient
         )
-
-        state["next_step"] = "ask_returning"
-
-        return state
-
-    # -----------------------------------------
-    # Assign appointment duration
-    # -----------------------------------------
-
-    p.appointment_duration_min = assign_duration(
-        p.returning_patient
     )
 
-    state["patient"] = p
-
-    return state
+    p.appointment_duration_min = mins
 
+    return (
+        f"Your appointment duration will be "
+        f"{mins} minutes.\n"
+        f"Which date works for you? "
+        f"(YYYY-MM-DD)"
+    )
 
-# =========================================================
-# ENSURE DOCTOR
-# =========================================================
 
-def node_ensure_doctor(
-    state: IntakeState
-) -> IntakeState:
+# (is-missing check, next_step, question) in the order fields are asked.
+# The question is either a fixed string or a callable building it from
+# the patient.
+FIELD_PROMPTS = (
+    (
+        lambda p: not p.problem,
+        "ask_problem",
+        "What seems to be the problem today?",
+    ),
+    (
+        lambda p: not p.problem_description,
+        "ask_problem_details",
+        "Could you describe the symptoms in a bit more detail?",
+    ),
+    (
+        lambda p: p.returning_patient is None,
+        "ask_returning",
+        "Have you visited us before? (yes/no)",
+    ),
+    (
+        lambda p: not p.doctor,
+        "ask_doctor",
+        "Do you have a preferred doctor?",
+    ),
+    (
+        lambda p: not p.appointment_date,
+        "ask_date",
+        _ask_date,
+    ),
+)
+
+
+def has_missing_fields(
+    p: PatientIntakeCore | None
+) -> bool:
     """
-    Ask preferred doctor if missing.
+    True while any FIELD_PROMPTS row is still unanswered.
     """
 
-    p: PatientIntake = state["patient"]
-
-    if not p.doctor:
-
-        state["message"] = (
-            "Do you have a preferred doctor?"
-        )
-
-        state["next_step"] = "ask_doctor"
-
-        return state
-
-    return state
+    if p is None:
+        return True
 
+    return any(missing(p) for missing, _, _ in FIELD_PROMPTS)
 
-# =========================================================
-# ENSURE DATE
-# =========================================================
 
-def node_ensure_date(
+def node_ensure_fields(
     state: IntakeState
 ) -> IntakeState:
     """
-    Ensure appointment date exists.
+    Ask for the first missing required field, scanning FIELD_PROMPTS
+    in order. Leaves the state untouched when everything is collected.
     """
 
-    p: PatientIntake = state["patient"]
-
-    if not p.appointment_date:
-
-        mins = (
-            p.appointment_duration_min
-            or assign_duration(
-                p.returning_patient
-            )
-        )
+    p: PatientIntakeCore = state["patient"]
 
-        p.appointment_duration_min = mins
+    for missing, next_step, question in FIELD_PROMPTS:
 
-        state["patient"] = p
+        if missing(p):
 
-        state["message"] = (
-            f"Your appointment duration will be "
-            f"{mins} minutes.\n"
-            f"Which date works for you? "
-            f"(YYYY-MM-DD)"
-        )
+            state["message"] = (
+                question(p) if callable(question) else question
+            )
 
-        state["next_step"] = "ask_date"
+            state["next_step"] = next_step
 
-        return state
+            return state
 
     return state
 
@@ -209,7 +156,7 @@ def node_fetch_slots(
 
     db = SessionLocal()
 
-    p: PatientIntake = state["patient"]
+    p: PatientIntakeCore = state["patient"]
 
     # -------------------------------------------------
     # Validate date
@@ -390,7 +337,7 @@ def node_book_appointment(
 
     db = SessionLocal()
 
-    p: PatientIntake = state["patient"]
+    p: PatientIntakeCore = state["patient"]
 
     selected_slot_id = state.get(
         "selected_slot_id"
@@ -521,13 +468,16 @@ def node_book_appointment(
     # Send confirmation email  (best-effort, non-blocking)
     # -----------------------------------------------------
 
+    email_queued = False
+
     try:
-        from api.services.notify import send_confirmation_email
+        from api.services.notify import send_confirmation_email_later
 
         user = get_user_by_id(db, user_id)
 
         if user and user.email:
-            send_confirmation_email(
+            # failures are logged by the Future's done-callback
+            send_confirmation_email_later(
                 to=user.email,
                 data={
                     "name":                   user.name or "Patient",
@@ -541,6 +491,7 @@ def node_book_appointment(
                     "booking_id":             str(appointment.booking_uuid),
                 },
             )
+            email_queued = True
 
     except Exception:
         # Never let email failure break the booking confirmation
@@ -554,13 +505,15 @@ def node_book_appointment(
     # Confirmation message
     # -----------------------------------------------------
 
-    state["message"] = (
-        f"Your appointment has been confirmed! "
-        f"A confirmation email has been sent to you.\n\n"
-        f"Doctor: {doctor.doctor_name}\n"
-        f"Date:   {slot.available_date}\n"
-        f"Time:   {slot.start_time} – {slot.end_time}\n"
-        f"Reason: {p.problem}"
+    state["message"] = booking_confirmation_message(
+        {
+            "doctor":            doctor.doctor_name,
+            "appointment_date":  str(slot.available_date),
+            "appointment_start": str(slot.start_time),
+            "appointment_end":   str(slot.end_time),
+            "problem":           p.problem,
+        },
+        email_queued=email_queued,
     )
 
     state["next_step"] = "done"
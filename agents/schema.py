@@ -1,7 +1,25 @@
 from __future__ import annotations
 from typing import Optional, TypedDict
-from pydantic import BaseModel, EmailStr, model_validator
+from pydantic import BaseModel, model_validator
+from dataclasses import asdict, dataclass
 from datetime import date, datetime
+from functools import lru_cache
+
+@lru_cache(maxsize=4096)
+def _age_on(dob: str, today_ordinal: int) -> Optional[int]:
+    """One strptime per distinct (dob, day)."""
+    try:
+        d = datetime.strptime(dob, "%Y-%m-%d").date()
+    except Exception:
+        return None
+    today = date.fromordinal(today_ordinal)
+    return today.year - d.year - ((today.month, today.day) < (d.month, d.day))
+
+def age_from_dob(dob: Optional[str]) -> Optional[int]:
+    """Age in whole years for a YYYY-MM-DD dob, or None if it can't be parsed."""
+    if not dob or not isinstance(dob, str):
+        return None
+    return _age_on(dob, date.today().toordinal())
 
 class PatientIntake(BaseModel):
     # Basic
@@ -16,7 +34,7 @@ class PatientIntake(BaseModel):
     problem_description: Optional[str] = None
 
     # Contact
-    # email: Optional[EmailStr] = None
+    # email: Optional[str] = None   # validate once at booking, not on every build
     # phone: Optional[str] = None
 
     # Insurance
@@ -36,21 +54,68 @@ class PatientIntake(BaseModel):
     def derive_age_from_dob(cls, data):
         if not isinstance(data, dict): return data
         if data.get("age") is None and data.get("dob"):
-            try:
-                dob = datetime.strptime(data["dob"], "%Y-%m-%d").date()
-                today = date.today()
-                data["age"] = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-            except Exception:
-                pass
+            age = age_from_dob(data["dob"])
+            if age is not None:
+                data["age"] = age
         return data
 
+@dataclass(slots=True)
+class PatientIntakeCore:
+    """
+    Unvalidated, slotted mirror of PatientIntake used inside the intake flow.
+    Converted only at the boundary (to_core / from_core).
+    """
+    dob: Optional[str] = None
+    age: Optional[int] = None
+    doctor: Optional[str] = None
+    location: Optional[str] = None
+    problem: Optional[str] = None
+    problem_description: Optional[str] = None
+    insurance_carrier: Optional[str] = None
+    insurance_member_id: Optional[str] = None
+    insurance_group: Optional[str] = None
+    returning_patient: Optional[bool] = None
+    appointment_duration_min: Optional[int] = None
+    appointment_date: Optional[str] = None
+    appointment_start: Optional[str] = None
+    appointment_end: Optional[str] = None
+
+def to_core(p: Optional[PatientIntake]) -> PatientIntakeCore:
+    if p is None:
+        return PatientIntakeCore()
+    if isinstance(p, PatientIntakeCore):
+        return p
+    return PatientIntakeCore(**p.__dict__)
+
+def from_core(core: PatientIntakeCore) -> PatientIntake:
+    # Fields were set individually by the nodes (and age derived in
+    # node_extract), so skip re-running validators on trusted data.
+    return PatientIntake.model_construct(**asdict(core))
+
+class PatientIntakeExtract(BaseModel):
+    """
+    Lean schema for the LLM extraction call only — the extractable fields,
+    all required strings ("" when not mentioned) so OpenAI strict JSON
+    schema mode can constrain decoding.
+    """
+    name: str
+    dob: str
+    doctor: str
+    location: str
+    problem: str
+    problem_description: str
+    email: str
+    phone: str
+    insurance_carrier: str
+    insurance_member_id: str
+    insurance_group: str
+
 class IntakeState(TypedDict, total=False):
     # Core conversation fields
     input_text: str
-    patient: PatientIntake
+    patient: PatientIntake | PatientIntakeCore   # Core while inside the flow
     message: str
     next_step: str
-    _inline: dict
 
     # Auth / session
     user_id: int
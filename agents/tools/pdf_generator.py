@@ -1,7 +1,3 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
 from datetime import datetime
 
 def generate_booking_pdf(output_path, data: dict):
@@ -13,6 +9,11 @@ def generate_booking_pdf(output_path, data: dict):
     insurance_member_id, insurance_group, email, phone,
     problem, problem_description, booking_id, ts, thread_id
     """
+    # reportlab is imported here so importing this module stays cheap
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
 
     doc = SimpleDocTemplate(output_path, pagesize=A4)
     styles = getSampleStyleSheet()
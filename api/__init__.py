@@ -1,9 +1,14 @@
 # api/__init__.py
-from typing import List
-from fastapi import APIRouter
-from .auth_router import router as auth_router
+from __future__ import annotations
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:
+    from fastapi import APIRouter
 
 def get_routers() -> List[APIRouter]:
+    # Routers are imported on demand so `import api` (e.g. for api.config or
+    # api.state) doesn't pull in pandas/reportlab/auth via the route modules.
     from .routes.scheduling import router as scheduling_router
     from .routes.ops import router as ops_router   # ← include ops
+    from .auth_router import router as auth_router
     return [scheduling_router, ops_router, auth_router]
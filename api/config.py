@@ -2,6 +2,9 @@
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Idempotent (never overrides variables already set); modules that read the
+# environment at import time import this module first, so .env applies
+# whichever package an entry point imports first.
 load_dotenv()
 
 # ---------------------------------------------------------------------------
@@ -12,10 +15,14 @@ DATA_DIR    = Path("data")
 STORAGE_DIR = Path("storage")
 
 BOOKINGS_XLSX  = STORAGE_DIR / "bookings.xlsx"
+BOOKINGS_CSV   = STORAGE_DIR / "bookings.csv"
 SCHEDULES_XLSX = DATA_DIR    / "schedules.xlsx"
+SCHEDULES_PARQUET_DIR = DATA_DIR / "schedules"  # per-sheet parquet copy of SCHEDULES_XLSX
 REMINDERS_XLSX = STORAGE_DIR / "reminders.xlsx"
+REMINDERS_CSV  = STORAGE_DIR / "reminders.csv"
 DOCTORS_CSV    = DATA_DIR    / "doctors.csv"
 PATIENTS_CSV   = DATA_DIR    / "patients.csv"
+PATIENTS_DB    = DATA_DIR    / "patients.db"
 
 # Ensure directories exist at import time so services don't crash
 DATA_DIR.mkdir(exist_ok=True)
@@ -1,12 +1,13 @@
 # api/routes/ops.py
 from __future__ import annotations
 
-from fastapi import APIRouter, Body
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Body
+from fastapi.concurrency import run_in_threadpool
 from typing import Any, Dict, List, Optional
 from pathlib import Path
 from datetime import datetime, timedelta
 import json
+import logging
 
 # Mailers
 from ..services.notify import send_confirmation_email, send_email
@@ -23,16 +24,30 @@ OUTBOX_DIR.mkdir(parents=True, exist_ok=True)
 REMINDERS_DIR.mkdir(parents=True, exist_ok=True)
 
 router = APIRouter()
+logger = logging.getLogger("medical_api")
+
+
+def _send_confirmation_quietly(to: str, data: Dict[str, Any], atts: List[Path]) -> None:
+    # background task: nothing to report back to, so log (the message also
+    # lands in the outbox as .eml)
+    try:
+        ok, info = send_confirmation_email(to=to, data=data, attachments=atts)
+        if not ok:
+            logger.warning("send_after_confirm: email to %r not sent: %s", to, info)
+    except Exception:
+        logger.exception("send_after_confirm: email to %r failed", to)
 
 
 @router.post("/notify/send_after_confirm")
-def send_after_confirm(payload: Dict[str, Any] = Body(...)):
+def send_after_confirm(background_tasks: BackgroundTasks, payload: Dict[str, Any] = Body(...)):
     """
     Send the actual confirmation email after booking.
     Body should include at least:
       - email (recipient)
       - booking details used by the templates (name, doctor, appointment_date, appointment_start, appointment_end, booking_id)
       - confirmation_pdf_path (optional; will attach if present)
+    The email is sent after the response goes out, so the reply is
+    {"ok": null, "queued": true} (as for /appointments/book); failures are logged.
     """
     data = dict(payload)
     to = data.get("email") or data.get("to") or ""
@@ -45,11 +60,8 @@ def send_after_confirm(payload: Dict[str, Any] = Body(...)):
         if p.exists():
             atts.append(p)
 
-    try:
-        ok, info = send_confirmation_email(to=to, data=data, attachments=atts)
-        return {"ok": ok, **({} if info is None else info)}
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"notify_error: {e}"})
+    background_tasks.add_task(_send_confirmation_quietly, to, data, atts)
+    return {"ok": None, "queued": True}
 
 
 @router.post("/emails/send")
@@ -73,8 +85,13 @@ def send_test_email(payload: Dict[str, Any] = Body(...)):
     return {"ok": ok, "eml_path": eml}
 
 
+def _write_ticket(ticket_path: Path, ticket: Dict[str, Any]) -> None:
+    with open(ticket_path, "w", encoding="utf-8") as f:
+        json.dump(ticket, f, ensure_ascii=False, indent=2)
+
+
 @router.post("/reminders/schedule")
-def schedule_reminder(payload: Dict[str, Any] = Body(...)):
+async def schedule_reminder(payload: Dict[str, Any] = Body(...)):
     """
     Tolerant reminder scheduler.
 
@@ -90,6 +107,7 @@ def schedule_reminder(payload: Dict[str, Any] = Body(...)):
     """
     to = payload.get("to") or payload.get("email")
     text = payload.get("text") or "Appointment reminder"
+    now = datetime.now()  # one clock read: ticket name and created_at agree
 
     # 1) Direct ISO timestamp
     when_iso = payload.get("when_iso")
@@ -99,7 +117,7 @@ def schedule_reminder(payload: Dict[str, Any] = Body(...)):
         mfn = payload.get("minutes_from_now")
         try:
             if mfn is not None:
-                when_iso = (datetime.now() + timedelta(minutes=int(mfn))).isoformat(timespec="seconds")
+                when_iso = (now + timedelta(minutes=int(mfn))).isoformat(timespec="seconds")
         except Exception:
             when_iso = None
 
@@ -110,17 +128,25 @@ def schedule_reminder(payload: Dict[str, Any] = Body(...)):
         dt = None
         if adate and astart:
             try:
-                dt = datetime.strptime(f"{adate} {astart}", "%Y-%m-%d %H:%M") - timedelta(minutes=30)
+                # zero-padded YYYY-MM-DD + HH:MM is already ISO-8601: parse in C
+                dt = datetime.fromisoformat(f"{adate}T{astart}")
             except Exception:
-                dt = None
+                try:
+                    dt = datetime.strptime(f"{adate} {astart}", "%Y-%m-%d %H:%M")
+                except Exception:
+                    dt = None
+            if dt is not None:
+                dt -= timedelta(minutes=30)
         if dt is None:
-            dt = datetime.now() + timedelta(minutes=30)  # 4) fallback
+            dt = now + timedelta(minutes=30)  # 4) fallback
         when_iso = dt.isoformat(timespec="seconds")
 
     # Try the real reminders service first
     try:
         if _reminders_mod and hasattr(_reminders_mod, "schedule_reminder"):
-            _reminders_mod.schedule_reminder(to=to, when_iso=when_iso, text=text, payload=payload)
+            await run_in_threadpool(
+                _reminders_mod.schedule_reminder, to=to, when_iso=when_iso, text=text, payload=payload
+            )
             return {"ok": True, "scheduled_for": when_iso, "via": "service"}
     except Exception:
         pass
@@ -130,12 +156,12 @@ def schedule_reminder(payload: Dict[str, Any] = Body(...)):
         "to": to,
         "text": text,
         "when_iso": when_iso,
-        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "created_at": now.isoformat(timespec="seconds"),
         "payload": payload,
     }
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ts = now.strftime("%Y%m%d_%H%M%S")
     ticket_path = REMINDERS_DIR / f"reminder_{ts}.json"
-    with open(ticket_path, "w", encoding="utf-8") as f:
-        json.dump(ticket, f, ensure_ascii=False, indent=2)
+    # disk write off the event loop
+    await run_in_threadpool(_write_ticket, ticket_path, ticket)
 
     return {"ok": True, "scheduled_for": when_iso, "ticket": str(ticket_path), "via": "file"}
@@ -1,19 +1,32 @@
 # api/routes/scheduling.py
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, Header, HTTPException, Response, status
 from fastapi.responses import JSONResponse
 from typing import Any, Dict, Optional, Tuple, List
 from datetime import datetime
 from pathlib import Path
+import atexit
+import csv
+import hashlib
+import logging
+import os
+import threading
 import uuid
-import pandas as pd
 
 from ..state import SESSION_STORE
 from ..dependencies import get_current_user
 
 # Email + PDF
-from ..services.notify import send_confirmation_email
+from ..services.notify import booking_confirmation_message, send_confirmation_email
+from ..services.filecache import read_cached
 from .utils.pdf import generate_booking_pdf
 
+# Booking IDs: time-ordered UUIDv7 when available, so new rows land at the
+# end of any index keyed on booking_id instead of at random positions
+try:
+    from uuid_utils import uuid7 as _new_booking_uuid
+except ImportError:
+    _new_booking_uuid = uuid.uuid4
+
 # Resilient import for patients upsert
 try:
     from ..services.patients import patients_service as _PATIENTS_SVC  # instance export
@@ -25,11 +38,21 @@ except Exception:
     _patients_mod = None
 
 router = APIRouter()
+logger = logging.getLogger("medical_api")
 
-BOOKINGS_XLSX = Path("storage/bookings.xlsx")
-BOOKINGS_CSV  = Path("storage/bookings.csv")   # fallback if openpyxl missing
+BOOKINGS_XLSX = Path("storage/bookings.xlsx")  # admin copy, regenerated from the CSV
+BOOKINGS_CSV  = Path("storage/bookings.csv")   # append-only source of truth
 CONFIRMATIONS_DIR = Path("storage/confirmations")
 
+# Fixed bookings.csv header: every key book() accepts, then the fields it
+# derives. Payload keys outside this list are still kept, appended after it.
+BOOKING_COLUMNS: Tuple[str, ...] = (
+    "name", "dob", "doctor", "date", "start", "end", "slot", "duration", "returning",
+    "insurance_carrier", "member_id", "group", "email", "phone",
+    "problem", "problem_description", "location", "thread_id",
+    "booking_id", "ts", "appointment_date", "appointment_start", "appointment_end",
+)
+
 
 # ---------- authenticated user-facing routes ----------
 
@@ -180,12 +203,122 @@ def _ensure_storage_dirs() -> None:
     BOOKINGS_XLSX.parent.mkdir(parents=True, exist_ok=True)
     CONFIRMATIONS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Serializes every bookings.csv write (seed, header check, append/rewrite):
+# book() runs in the threadpool, and a header-drift rewrite racing an
+# append would drop the other row.
+_BOOKINGS_LOCK = threading.Lock()
+_XLSX_LOCK = threading.Lock()        # one rebuild at a time
+_XLSX_TIMER_LOCK = threading.Lock()  # pending-rebuild state only, never held long
+
+# bookings.xlsx is an admin copy: rebuilt at most once per
+# BOOKINGS_XLSX_DELAY_S after a booking marks it dirty (and at exit), so a
+# burst of bookings costs one rebuild instead of one each.
+_XLSX_COMPACT_DELAY_S = float(os.getenv("BOOKINGS_XLSX_DELAY_S", "60"))
+_xlsx_timer: Optional[threading.Timer] = None
+
+def _seed_csv_from_xlsx() -> None:
+    """One-time migration: older installs kept bookings only in the xlsx."""
+    if BOOKINGS_CSV.exists() or not BOOKINGS_XLSX.exists():
+        return
+    import pandas as pd
+    pd.read_excel(BOOKINGS_XLSX, engine="openpyxl").to_csv(BOOKINGS_CSV, index=False)
+
+def _append_booking_row(data: Dict[str, Any]) -> None:
+    """
+    Append one booking to bookings.csv. Cost no longer grows with the table;
+    the header is BOOKING_COLUMNS, so the file is only rewritten when an older
+    header lacks a column or a payload brings an unknown key.
+    """
+    with _BOOKINGS_LOCK:
+        _append_booking_row_locked(data)
+
+def _append_booking_row_locked(data: Dict[str, Any]) -> None:
+    _seed_csv_from_xlsx()
+    cols: List[str] = []
+    if BOOKINGS_CSV.exists() and BOOKINGS_CSV.stat().st_size:
+        with open(BOOKINGS_CSV, newline="", encoding="utf-8") as f:
+            cols = next(csv.reader(f), [])
+
+    if not cols:
+        fieldnames = list(BOOKING_COLUMNS) + [k for k in data if k not in BOOKING_COLUMNS]
+        with open(BOOKINGS_CSV, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=fieldnames)
+            w.writeheader()
+            w.writerow(data)
+        return
+
+    known = set(cols)
+    new_cols = [k for k in BOOKING_COLUMNS if k not in known]
+    new_cols += [k for k in data if k not in known and k not in BOOKING_COLUMNS]
+    if new_cols:
+        # header drift: widen the header once and rewrite
+        with open(BOOKINGS_CSV, newline="", encoding="utf-8") as f:
+            rows: List[Dict[str, Any]] = list(csv.DictReader(f))
+        rows.append(data)
+        with open(BOOKINGS_CSV, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=cols + new_cols)
+            w.writeheader()
+            w.writerows(rows)
+        return
+
+    with open(BOOKINGS_CSV, "a", newline="", encoding="utf-8") as f:
+        csv.DictWriter(f, fieldnames=cols).writerow(data)
+
+def _schedule_xlsx_compaction() -> None:
+    """Mark bookings.xlsx stale; one pending timer rebuilds it for all marks."""
+    global _xlsx_timer
+    with _XLSX_TIMER_LOCK:
+        if _xlsx_timer is not None:
+            return
+        _xlsx_timer = threading.Timer(_XLSX_COMPACT_DELAY_S, _compact_bookings_xlsx)
+        _xlsx_timer.daemon = True
+        _xlsx_timer.start()
+
+def _flush_bookings_xlsx() -> None:
+    """At exit: rebuild now if a compaction is still pending."""
+    global _xlsx_timer
+    with _XLSX_TIMER_LOCK:
+        timer, _xlsx_timer = _xlsx_timer, None
+    if timer is not None:
+        timer.cancel()
+        _compact_bookings_xlsx()
+
+atexit.register(_flush_bookings_xlsx)
+
+def _compact_bookings_xlsx() -> None:
+    """Regenerate bookings.xlsx from bookings.csv with a write-only workbook."""
+    global _xlsx_timer
+    with _XLSX_TIMER_LOCK:
+        _xlsx_timer = None  # bookings from here on schedule a new rebuild
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return  # CSV stays the only copy
+    with _XLSX_LOCK:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        with _BOOKINGS_LOCK, open(BOOKINGS_CSV, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                ws.append(row)
+        tmp = BOOKINGS_XLSX.with_name(f"{BOOKINGS_XLSX.name}.{os.getpid()}.tmp")  # per process
+        wb.save(tmp)
+        tmp.replace(BOOKINGS_XLSX)
+
+_HHMM_SEP = frozenset(".:-")
+
 def _normalize_hhmm(x: Optional[str]) -> Optional[str]:
     if x is None:
         return None
     s = str(x).strip()
     if not s:
         return None
+    # fast path: the common fixed-width "HH:MM" (or HH.MM / HH-MM)
+    if len(s) == 5 and s[2] in _HHMM_SEP and s.isascii() and s[:2].isdigit() and s[3:].isdigit():
+        h = (ord(s[0]) - 48) * 10 + (ord(s[1]) - 48)
+        m = (ord(s[3]) - 48) * 10 + (ord(s[4]) - 48)
+        if h > 23 or m > 59:
+            return None
+        return f"{s[:2]}:{s[3:]}"
     s = s.replace(".", ":").replace("-", ":")
     parts = s.split(":")
     try:
@@ -211,8 +344,13 @@ def _derive_times_from_payload(p: Dict[str, Any]) -> Tuple[Optional[str], Option
     return None, None
 
 def _t2min(hhmm: str) -> int:
-    h, m = hhmm.split(":")
-    return int(h) * 60 + int(m)
+    """Minutes since midnight for an already-normalized "HH:MM"."""
+    return int(hhmm[0:2]) * 60 + int(hhmm[3:5])
+
+def _hhmm_to_min(col):
+    """Vectorized _t2min over a Series of "HH:MM[...]" strings."""
+    parts = col.str.split(":", n=2, expand=True)
+    return parts[0].astype(int) * 60 + parts[1].astype(int)
 
 def _min2t(x: int) -> str:
     return f"{x // 60:02d}:{x % 60:02d}"
@@ -240,13 +378,13 @@ def _interval_subtract(free: List[Tuple[int, int]], busy: List[Tuple[int, int]])
     return res
 
 def _generate_slots(free_windows: List[Tuple[int, int]], duration: int, step: int) -> List[Tuple[str, str]]:
-    out: List[Tuple[str, str]] = []
-    for ws, we in free_windows:
-        t = ws
-        while t + duration <= we:
-            out.append((_min2t(t), _min2t(t + duration)))
-            t += step
-    return out
+    # range() drives the counted loop in C; same starts as stepping t by `step`
+    # while t + duration <= we
+    return [
+        (_min2t(t), _min2t(t + duration))
+        for ws, we in free_windows
+        for t in range(ws, we - duration + 1, step)
+    ]
 
 def _upsert_patient_from_booking(data: Dict[str, Any]) -> None:
     """Call upsert regardless of how services/patients.py is structured."""
@@ -270,12 +408,36 @@ def _upsert_patient_from_booking(data: Dict[str, Any]) -> None:
     # Silent if unavailable
 
 
+def _slots_etag(doctor: str, date: str, duration_min: int, step_min: int) -> str:
+    """
+    Validator for an /appointments/available answer: the query plus the
+    bookings file version it is computed from (slots change only when
+    bookings do), so a revalidation is answered without touching pandas.
+    """
+    sig: Tuple[Any, ...] = ()
+    for p in (BOOKINGS_CSV, BOOKINGS_XLSX):
+        if p.exists():
+            st = p.stat()
+            sig = (p.name, st.st_mtime_ns, st.st_size)
+            break
+    raw = repr((doctor, date, duration_min, step_min, sig)).encode()
+    return f'W/"{hashlib.blake2b(raw, digest_size=12).hexdigest()}"'
+
+
 # ---------- routes ----------
 
 @router.get("/appointments/available")
-def available_slots(doctor: str, date: str, duration_min: int = 30, step_min: int = 30):
+def available_slots(
+    doctor: str,
+    date: str,
+    response: Response,
+    duration_min: int = 30,
+    step_min: int = 30,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Returns available slots for a doctor on a given date.
+    Sends an ETag; a matching If-None-Match gets an empty 304.
     """
     # Validate date
     try:
@@ -283,17 +445,27 @@ def available_slots(doctor: str, date: str, duration_min: int = 30, step_min: in
     except Exception:
         return JSONResponse(status_code=422, content={"error": "date must be YYYY-MM-DD"})
 
+    etag = _slots_etag(doctor, date, duration_min, step_min)
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}  # always revalidate
+    if if_none_match and etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    response.headers.update(cache_headers)
+
     # Working hours default: 09:00–17:00
     working_hours = [("09:00", "17:00")]
     free_windows = [(_t2min(s), _t2min(e)) for s, e in working_hours]
 
     # Busy intervals from bookings.xlsx or csv
+    import pandas as pd  # deferred so importing the router doesn't load pandas
+
     busy: List[Tuple[int, int]] = []
     try:
-        if BOOKINGS_XLSX.exists():
-            df = pd.read_excel(BOOKINGS_XLSX, engine="openpyxl")
-        elif BOOKINGS_CSV.exists():
-            df = pd.read_csv(BOOKINGS_CSV)
+        # parsed once per file version; filtering below builds new frames.
+        # The CSV is the up-to-date copy; the xlsx only for older installs.
+        if BOOKINGS_CSV.exists():
+            df = read_cached(BOOKINGS_CSV, lambda: pd.read_csv(BOOKINGS_CSV, dtype=str, engine="pyarrow"), "slots")
+        elif BOOKINGS_XLSX.exists():
+            df = read_cached(BOOKINGS_XLSX, lambda: pd.read_excel(BOOKINGS_XLSX, engine="openpyxl"), "slots")
         else:
             df = None
 
@@ -308,10 +480,11 @@ def available_slots(doctor: str, date: str, duration_min: int = 30, step_min: in
             if (doctor or "").strip().lower() not in ("any", "any doctor"):
                 df = df[df[doc_col] == doctor]
 
-            for _, row in df.iterrows():
-                s, e = str(row.get(s_col, "")).strip(), str(row.get(e_col, "")).strip()
-                if s and e and ":" in s and ":" in e:
-                    busy.append((_t2min(s), _t2min(e)))
+            if s_col in df.columns and e_col in df.columns:
+                starts = df[s_col].astype(str).str.strip()
+                ends = df[e_col].astype(str).str.strip()
+                ok = starts.str.contains(":", regex=False) & ends.str.contains(":", regex=False)
+                busy = list(zip(_hhmm_to_min(starts[ok]).tolist(), _hhmm_to_min(ends[ok]).tolist()))
     except Exception:
         busy = []
 
@@ -328,17 +501,40 @@ def available_slots(doctor: str, date: str, duration_min: int = 30, step_min: in
     }
 
 
+def _send_booking_confirmation(data: Dict[str, Any]) -> None:
+    """
+    Email the confirmation (best-effort, with the PDF when it was generated).
+    Runs as a background task, so the SMTP round-trip doesn't hold up the
+    booking response; failures are logged, and the message lands in the
+    outbox as .eml.
+    """
+    pdf = data.get("confirmation_pdf_path")
+    try:
+        ok, info = send_confirmation_email(
+            to=data.get("email", ""), data=data, attachments=[Path(pdf)] if pdf else []
+        )
+        if not ok:
+            logger.warning("book: confirmation email not sent for booking_id=%s: %s", data.get("booking_id"), info)
+    except Exception:
+        logger.exception("book: confirmation email failed for booking_id=%s", data.get("booking_id"))
+
+
 @router.post("/appointments/book")
-def book(payload: Dict[str, Any] = Body(...)):
+def book(background_tasks: BackgroundTasks, payload: Dict[str, Any] = Body(...)):
     """
     Accepts: name, dob, doctor, date, start, end OR slot, duration, returning,
     insurance_carrier, member_id, group, email, phone,
     problem, problem_description, location, thread_id (optional)
+
+    The confirmation PDF is written before responding (confirmation_pdf_path
+    is null if that failed); the email is sent after the response, so
+    "email" is {"ok": null, "queued": true} rather than the send result,
+    or {"ok": null, "queued": false} when the payload has no email.
     """
     _ensure_storage_dirs()  # ensure storage/ and confirmations/ exist
 
     data = dict(payload)
-    data.setdefault("booking_id", str(uuid.uuid4()))
+    data.setdefault("booking_id", str(_new_booking_uuid()))
     data.setdefault("ts", datetime.now().isoformat(timespec="seconds"))
 
     # Normalize key fields
@@ -347,40 +543,11 @@ def book(payload: Dict[str, Any] = Body(...)):
     data["appointment_start"] = start_norm
     data["appointment_end"]   = end_norm
 
-    # 1) Append booking row to Excel (fallback to CSV if openpyxl missing)
+    # 1) Append booking row to the CSV; the xlsx copy is rebuilt later
     try:
-        row_df = pd.DataFrame([data])
-        used_format = "xlsx"
-
-        if BOOKINGS_XLSX.exists():
-            try:
-                prev = pd.read_excel(BOOKINGS_XLSX, engine="openpyxl")
-                # Align columns to avoid drift
-                all_cols = list(dict.fromkeys(list(prev.columns) + list(row_df.columns)))
-                prev = prev.reindex(columns=all_cols)
-                row_df = row_df.reindex(columns=all_cols)
-                out = pd.concat([prev, row_df], ignore_index=True)
-                out.to_excel(BOOKINGS_XLSX, index=False, engine="openpyxl")
-            except Exception:
-                # Fallback to CSV to avoid blocking
-                used_format = "csv"
-                if BOOKINGS_CSV.exists():
-                    prev = pd.read_csv(BOOKINGS_CSV)
-                    all_cols = list(dict.fromkeys(list(prev.columns) + list(row_df.columns)))
-                    prev = prev.reindex(columns=all_cols)
-                    row_df = row_df.reindex(columns=all_cols)
-                    out = pd.concat([prev, row_df], ignore_index=True)
-                else:
-                    out = row_df
-                out.to_csv(BOOKINGS_CSV, index=False)
-        else:
-            try:
-                row_df.to_excel(BOOKINGS_XLSX, index=False, engine="openpyxl")
-            except Exception:
-                used_format = "csv"
-                row_df.to_csv(BOOKINGS_CSV, index=False)
-
-        data["admin_export_format"] = used_format
+        _append_booking_row(data)
+        data["admin_export_format"] = "csv"
+        _schedule_xlsx_compaction()
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"book_error: {e}"})
 
@@ -392,18 +559,19 @@ def book(payload: Dict[str, Any] = Body(...)):
 
     # 3) Persist into conversation session (so agent + UI can read it)
     tid = (data.get("thread_id") or "").strip()
-    if tid and tid in SESSION_STORE:
-        sess = SESSION_STORE.get(tid, {})
+    update_fields = {
+        "doctor": data.get("doctor"),
+        "appointment_date": data.get("appointment_date"),
+        "appointment_start": data.get("appointment_start"),
+        "appointment_end": data.get("appointment_end"),
+    }
+    update_fields = {k: v for k, v in update_fields.items() if v not in (None, "")}
+    session_patient: Dict[str, Any] = dict(update_fields)  # no session: the booked fields
+    sess = SESSION_STORE.get(tid) if tid else None
+    if sess is not None:
         sess["booking_done"] = True  # ensure post-booking shows "Thank you"
 
         p = sess.get("patient")
-        update_fields = {
-            "doctor": data.get("doctor"),
-            "appointment_date": data.get("appointment_date"),
-            "appointment_start": data.get("appointment_start"),
-            "appointment_end": data.get("appointment_end"),
-        }
-        update_fields = {k: v for k, v in update_fields.items() if v not in (None, "")}
 
         if p is not None:
             try:
@@ -417,30 +585,31 @@ def book(payload: Dict[str, Any] = Body(...)):
                 pdict = dict(p); pdict.update(update_fields); sess["patient"] = pdict
 
         SESSION_STORE[tid] = sess
+        p = sess.get("patient")
+        session_patient = p.model_dump() if hasattr(p, "model_dump") else dict(p or {})
 
-    # 4) Generate the PDF confirmation (best-effort)
+    # 4) PDF confirmation now, so the returned path exists; email after the response
+    pdf_path = CONFIRMATIONS_DIR / f"{data['booking_id']}.pdf"
     try:
-        pdf_path = CONFIRMATIONS_DIR / f"{data['booking_id']}.pdf"
         generate_booking_pdf(pdf_path, data)
         data["confirmation_pdf_path"] = str(pdf_path)
     except Exception:
+        logger.exception("book: PDF generation failed for booking_id=%s", data["booking_id"])
         data["confirmation_pdf_path"] = None
+    email_queued = bool(data.get("email"))
+    if email_queued:
+        background_tasks.add_task(_send_booking_confirmation, dict(data))
+    email_status = {"ok": None, "queued": email_queued}
 
-    # 5) Send the confirmation email and expose status in response
-    email_status = {"ok": False}
-    try:
-        atts = []
-        if data.get("confirmation_pdf_path"):
-            atts.append(Path(data["confirmation_pdf_path"]))
-        ok, info = send_confirmation_email(to=data.get("email",""), data=data, attachments=atts)
-        # info is None on success or dict on failure (eml_path, error)
-        email_status = {"ok": ok, **({} if info is None else info)}
-    except Exception as e:
-        email_status = {"ok": False, "error": str(e)}
+    # The chat's confirmation text and patient state ride along, so the
+    # client doesn't need another /chat round trip to show the confirmation
+    next_message = booking_confirmation_message(data, email_queued=email_queued)
 
     return {
         "status": "ok",
         "booking_id": data["booking_id"],
         "payload": data,
         "email": email_status,
+        "next_message": next_message,
+        "data": session_patient,
     }
@@ -7,6 +7,48 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 
+# Styles are identical for every booking; build them once at import. Flowables
+# (Paragraph, Table) keep layout state while a document is built, so those are
+# created per call.
+_STYLES = getSampleStyleSheet()
+_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#2a9d8f")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('GRID', (0, 0), (-1, -1), 0.4, colors.grey),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.lightgrey]),
+])
+_FOOTER_TEXT = (
+    "This document serves as confirmation of your scheduled appointment. "
+    "Please bring any necessary documents and arrive 10 minutes early."
+)
+
+# (label, data key[, default]) for each table row, top to bottom.
+_FIELDS = (
+    ("Patient Name", "name"),
+    ("Doctor", "doctor"),
+    ("Date", "appointment_date"),
+    ("Start Time", "appointment_start"),
+    ("End Time", "appointment_end"),
+    ("Duration (min)", "appointment_duration_min"),
+    ("Returning Patient", "returning_patient"),
+    ("Payment/Carrier", "insurance_carrier", "self-pay"),
+    ("Member ID", "insurance_member_id"),
+    ("Group Number", "insurance_group"),
+    ("Email", "email"),
+    ("Phone", "phone"),
+    ("Problem", "problem"),
+    ("Problem Description", "problem_description"),
+    ("Booking ID", "booking_id"),
+    ("Thread ID", "thread_id"),
+    ("Timestamp", "ts"),
+)
+_COL_WIDTHS = (150, 350)
+# ReportLab's height for a one-line 10pt cell: 12pt leading + 3pt top/bottom padding
+_ROW_HEIGHT = 18
+
 def _val(x: Optional[str]) -> str:
     return "" if x is None else str(x)
 
@@ -14,53 +56,22 @@ def generate_booking_pdf(output_path: Path, data: Dict[str, Any]) -> Path:
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     doc = SimpleDocTemplate(str(output_path), pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
-
-    story.append(Paragraph("Appointment Confirmation", styles["Title"]))
-    story.append(Spacer(1, 10))
-    story.append(Paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles["Normal"]))
-    story.append(Spacer(1, 16))
-
-    table_data = [
-        ["Field", "Value"],
-        ["Patient Name", _val(data.get("name"))],
-        ["Doctor", _val(data.get("doctor"))],
-        ["Date", _val(data.get("appointment_date"))],
-        ["Start Time", _val(data.get("appointment_start"))],
-        ["End Time", _val(data.get("appointment_end"))],
-        ["Duration (min)", _val(data.get("appointment_duration_min"))],
-        ["Returning Patient", _val(data.get("returning_patient"))],
-        ["Payment/Carrier", _val(data.get("insurance_carrier", "self-pay"))],
-        ["Member ID", _val(data.get("insurance_member_id"))],
-        ["Group Number", _val(data.get("insurance_group"))],
-        ["Email", _val(data.get("email"))],
-        ["Phone", _val(data.get("phone"))],
-        ["Problem", _val(data.get("problem"))],
-        ["Problem Description", _val(data.get("problem_description"))],
-        ["Booking ID", _val(data.get("booking_id"))],
-        ["Thread ID", _val(data.get("thread_id"))],
-        ["Timestamp", _val(data.get("ts"))],
-    ]
+    ts_para = Paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", _STYLES["Normal"])
 
-    table = Table(table_data, colWidths=[150, 350])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#2a9d8f")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('GRID', (0, 0), (-1, -1), 0.4, colors.grey),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.whitesmoke, colors.lightgrey]),
-    ]))
+    table_data = [["Field", "Value"]]
+    table_data += [[label, _val(data.get(key, *default))] for label, key, *default in _FIELDS]
 
-    story.append(table)
-    story.append(Spacer(1, 18))
-    story.append(Paragraph(
-        "This document serves as confirmation of your scheduled appointment. "
-        "Please bring any necessary documents and arrive 10 minutes early.",
-        styles["Normal"]
-    ))
+    # one-line cells all measure _ROW_HEIGHT, so pass the heights in and skip
+    # the per-cell measuring pass; multi-line values still get measured
+    single_line = not any("\n" in v for _, v in table_data)
+    table = Table(table_data, colWidths=list(_COL_WIDTHS),
+                  rowHeights=[_ROW_HEIGHT] * len(table_data) if single_line else None)
+    table.setStyle(_TABLE_STYLE)
 
-    doc.build(story)
+    doc.build([
+        Paragraph("Appointment Confirmation", _STYLES["Title"]), Spacer(1, 10),
+        ts_para, Spacer(1, 16),
+        table, Spacer(1, 18),
+        Paragraph(_FOOTER_TEXT, _STYLES["Normal"]),
+    ])
     return output_path
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from dataclasses import dataclass
+import json
 from datetime import datetime, date as _date
+from functools import lru_cache
 from typing import List, Dict, Tuple, Optional, Iterable, Set
 from pandas import ExcelFile
 from typing import Tuple
@@ -9,12 +11,27 @@ from api.config import SCHEDULES_XLSX, DOCTORS_CSV, BOOKINGS_XLSX
 import pandas as pd
 
 from api.config import (
+    BOOKINGS_CSV,
     BOOKINGS_XLSX,
     SCHEDULES_XLSX,
+    SCHEDULES_PARQUET_DIR,
     DOCTORS_CSV,
 )
+from api.services.filecache import read_cached
+
+# Only these booking columns are ever read; everything is matched as text.
+_BOOKING_COLS = ("doctor", "date", "start", "end")
+
+def _read_bookings_csv() -> pd.DataFrame:
+    # pyarrow's multithreaded CSV parser; it doesn't take a callable usecols,
+    # so the booking columns are picked after the read
+    df = pd.read_csv(BOOKINGS_CSV, dtype=str, engine="pyarrow")
+    return df[[c for c in _BOOKING_COLS if c in df.columns]]
 
 def _hm_diff_min(hm1: str, hm2: str) -> int:
+    if len(hm1) == len(hm2) == 5 and hm1[2] == hm2[2] == ":":
+        # fixed-width HH:MM: plain integer arithmetic, no strptime
+        return (int(hm2[0:2]) - int(hm1[0:2])) * 60 + (int(hm2[3:5]) - int(hm1[3:5]))
     a = datetime.strptime(hm1, "%H:%M")
     b = datetime.strptime(hm2, "%H:%M")
     return int((b - a).total_seconds() // 60)
@@ -25,18 +42,23 @@ def _weekday_key(dt: _date) -> str:
     if wd == 5: return "hours_saturday"
     return "hours_weekday"
 
-def _parse_ranges(ranges_str: str) -> List[Tuple[str, str]]:
+# Both are pure in their arguments and see the same few doctors.csv strings
+# on every request, so results are memoized (as tuples, so nothing shared
+# can be mutated by a caller).
+@lru_cache(maxsize=512)
+def _parse_ranges(ranges_str: str) -> Tuple[Tuple[str, str], ...]:
     if not isinstance(ranges_str, str) or not ranges_str.strip():
-        return []
+        return ()
     parts = [p.strip() for p in ranges_str.split(";") if p.strip()]
     out = []
     for p in parts:
         if "-" in p:
             a, b = p.split("-", 1)
             out.append((a.strip(), b.strip()))
-    return out
+    return tuple(out)
 
-def _mk_slots(step_min: int, ranges: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+@lru_cache(maxsize=512)
+def _mk_slots(step_min: int, ranges: Tuple[Tuple[str, str], ...]) -> Tuple[Tuple[str, str], ...]:
     out: List[Tuple[str, str]] = []
     for s, e in ranges:
         h1, m1 = map(int, s.split(":")); h2, m2 = map(int, e.split(":"))
@@ -47,50 +69,146 @@ def _mk_slots(step_min: int, ranges: Iterable[Tuple[str, str]]) -> List[Tuple[st
             eh, em = divmod(cur + step_min, 60)
             out.append((f"{sh:02d}:{sm:02d}", f"{eh:02d}:{em:02d}"))
             cur += step_min
-    return out
+    return tuple(out)
 
 def _dedupe(seq: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
-    seen: Set[Tuple[str, str]] = set()
+    # order-preserving; the dedup loop runs inside dict construction
+    return list(dict.fromkeys(seq))
+
+def _stitch(base: List[Tuple[str, str]], k: int) -> List[Tuple[str, str]]:
+    """
+    Every run of k back-to-back slots, merged into one (start, end) slot.
+    Single sweep keeping the length of the current contiguous streak.
+    """
     out: List[Tuple[str, str]] = []
-    for s in seq:
-        if s not in seen:
-            seen.add(s)
-            out.append(s)
-    return out
+    streak = 0
+    for i, (s, e) in enumerate(base):
+        streak = streak + 1 if i and base[i - 1][1] == s else 1
+        if streak >= k:
+            out.append((base[i - k + 1][0], e))
+    # rows aren't guaranteed sorted/unique, so the same window can repeat
+    return _dedupe(out)
+
+# schedules.xlsx is converted once per file version into one parquet file
+# per sheet. Other workers and later restarts memory-map those instead of
+# unzipping and parsing the workbook XML again.
+_SCHEDULES_MANIFEST = SCHEDULES_PARQUET_DIR / "manifest.json"
+
+def _xlsx_signature() -> List[int]:
+    st = SCHEDULES_XLSX.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+def _load_schedules_parquet() -> Optional[Dict[str, pd.DataFrame]]:
+    """The parquet copy, or None if it's missing or stale."""
+    try:
+        manifest = json.loads(_SCHEDULES_MANIFEST.read_text(encoding="utf-8"))
+        if manifest.get("source") != _xlsx_signature():
+            return None
+        return {
+            sheet: pd.read_parquet(SCHEDULES_PARQUET_DIR / fname, memory_map=True)
+            for sheet, fname in manifest["sheets"]
+        }
+    except Exception:
+        return None
+
+def _save_schedules_parquet(sheets: Dict[str, pd.DataFrame], source: List[int]) -> None:
+    """Best-effort: if any sheet can't be encoded, no manifest is written and the xlsx stays the source."""
+    try:
+        SCHEDULES_PARQUET_DIR.mkdir(parents=True, exist_ok=True)
+        written = []
+        for i, (sheet, df) in enumerate(sheets.items()):
+            fname = f"sheet_{i}.parquet"
+            df.to_parquet(SCHEDULES_PARQUET_DIR / fname, index=False)
+            written.append([sheet, fname])
+        tmp = _SCHEDULES_MANIFEST.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"source": source, "sheets": written}), encoding="utf-8")
+        tmp.replace(_SCHEDULES_MANIFEST)  # manifest last: readers never see a half-written set
+    except Exception:
+        pass
 
 @dataclass
 class CalendarService:
     """Excel-first scheduling engine with CSV fallback (per assignment)."""
 
     def read_bookings(self) -> pd.DataFrame:
+        # bookings.csv is the append-only source of truth; the xlsx lags it
+        if BOOKINGS_CSV.exists():
+            try:
+                return read_cached(BOOKINGS_CSV, _read_bookings_csv, "calendar")
+            except Exception:
+                pass
         if BOOKINGS_XLSX.exists():
             try:
-                return pd.read_excel(BOOKINGS_XLSX)
+                return read_cached(BOOKINGS_XLSX, lambda: pd.read_excel(
+                    BOOKINGS_XLSX, usecols=lambda c: c in _BOOKING_COLS, dtype=str
+                ), "calendar")
             except Exception:
                 pass
-        return pd.DataFrame(columns=["doctor", "date", "start", "end"])
+        return pd.DataFrame(columns=list(_BOOKING_COLS))
+
+    def _busy_index(self) -> Dict[Tuple[str, str], Set[Tuple[str, str]]]:
+        """
+        (doctor lower, date) -> booked (start, end) HH:MM pairs, built once per
+        bookings-file version so each availability call is a dict probe.
+        """
+        src = BOOKINGS_CSV if BOOKINGS_CSV.exists() else BOOKINGS_XLSX
+        if not src.exists():
+            return {}
+
+        def _build() -> Dict[Tuple[str, str], Set[Tuple[str, str]]]:
+            df = self.read_bookings()
+            idx: Dict[Tuple[str, str], Set[Tuple[str, str]]] = {}
+            for doc, d, st, en in zip(df["doctor"], df["date"], df["start"], df["end"]):
+                if not isinstance(doc, str):
+                    continue  # no doctor → never matches a lookup
+                idx.setdefault((doc.strip().lower(), str(d)), set()).add((str(st)[:5], str(en)[:5]))
+            return idx
+
+        return read_cached(src, _build, "busy-index")
 
     # ---------- Excel source of truth ----------
+    def _schedule_sheets(self) -> Dict[str, pd.DataFrame]:
+        """
+        Every sheet of schedules.xlsx, parsed in one workbook open per file
+        version (or read back from its parquet copy).
+        """
+        def _read_all() -> Dict[str, pd.DataFrame]:
+            cached = _load_schedules_parquet()
+            if cached is not None:
+                return cached
+            source = _xlsx_signature()
+            sheets: Dict[str, pd.DataFrame] = {}
+            with ExcelFile(SCHEDULES_XLSX) as xf:
+                for sh in xf.sheet_names:
+                    try:
+                        sheets[sh] = xf.parse(sh)
+                    except Exception:
+                        pass  # unreadable sheet → that doctor has no slots
+            _save_schedules_parquet(sheets, source)
+            return sheets
+        return read_cached(SCHEDULES_XLSX, _read_all, "<sheets>")
+
     def available_from_excel(self, doctor: str, date_str: str, duration_min: int) -> List[Dict]:
         if not SCHEDULES_XLSX.exists():
             return []
         try:
-            df = pd.read_excel(SCHEDULES_XLSX, sheet_name=doctor)  # sheet name == doctor
+            df = self._schedule_sheets().get(doctor)  # sheet name == doctor
         except Exception:
             return []
+        if df is None:
+            return []
+        return self.available_from_excel_df(df, doctor, date_str, duration_min)
 
-        df["date"] = df["date"].astype(str)
-        day = df[df["date"] == date_str].copy()
+    def available_from_excel_df(self, df: pd.DataFrame, doctor: str, date_str: str, duration_min: int) -> List[Dict]:
+        # df is shared via the cache — filter into a copy, never mutate it
+        day = df[df["date"].astype(str) == date_str].copy()
         if day.empty:
             return []
 
         day["start"] = day["start"].astype(str).str.slice(0, 5)
         day["end"] = day["end"].astype(str).str.slice(0, 5)
 
-        booked = self.read_bookings()
-        booked = booked[(booked["doctor"].str.strip().str.lower() == doctor.strip().lower())
-                        & (booked["date"].astype(str) == date_str)]
-        booked_set = set((str(r["start"])[:5], str(r["end"])[:5]) for _, r in booked.iterrows())
+        booked_set = self._busy_index().get((doctor.strip().lower(), date_str), frozenset())
         base = [(s, e) for s, e in day[["start", "end"]].itertuples(index=False, name=None)
                 if (s, e) not in booked_set]
 
@@ -103,28 +221,33 @@ class CalendarService:
 
         # stitch
         k = (duration_min + step - 1) // step
-        stitched: List[Tuple[str, str]] = []
-        for i in range(len(base)):
-            block = base[i:i+k]
-            if len(block) < k:
-                break
-            if all(block[j][1] == block[j+1][0] for j in range(k-1)):
-                stitched.append((block[0][0], block[-1][1]))
-        stitched = _dedupe(stitched)
+        stitched = _stitch(base, k)
         return [{"doctor": doctor, "date": date_str, "start": s, "end": e} for (s, e) in stitched]
 
     # ---------- CSV fallback ----------
+    def _read_doctors(self) -> pd.DataFrame:
+        return read_cached(DOCTORS_CSV, lambda: pd.read_csv(DOCTORS_CSV, dtype=str, engine="pyarrow"))
+
+    def _doctors_index(self) -> Dict[str, Dict]:
+        """doctor lower -> first doctors.csv row for it, rebuilt when the file changes."""
+        def _build() -> Dict[str, Dict]:
+            idx: Dict[str, Dict] = {}
+            for row in self._read_doctors().to_dict("records"):
+                doc = row.get("doctor")
+                if isinstance(doc, str):
+                    idx.setdefault(doc.strip().lower(), row)
+            return idx
+        return read_cached(DOCTORS_CSV, _build, "index")
+
     def available_from_csv(self, doctor: str, date_str: str, duration_min: int) -> List[Dict]:
         if not DOCTORS_CSV.exists():
             return []
         try:
-            df = pd.read_csv(DOCTORS_CSV)
+            row = self._doctors_index().get(doctor.strip().lower())
         except Exception:
             return []
-        hit = df[df["doctor"].str.strip().str.lower() == doctor.strip().lower()]
-        if hit.empty:
+        if row is None:
             return []
-        row = hit.iloc[0].to_dict()
 
         try:
             step = int(row.get("slot_mins", 30))
@@ -141,24 +264,14 @@ class CalendarService:
             return []
         base = _mk_slots(step, ranges)
 
-        booked = self.read_bookings()
-        booked = booked[(booked["doctor"].str.strip().str.lower() == doctor.strip().lower())
-                        & (booked["date"].astype(str) == date_str)]
-        booked_set = set((str(r["start"])[:5], str(r["end"])[:5]) for _, r in booked.iterrows())
+        booked_set = self._busy_index().get((doctor.strip().lower(), date_str), frozenset())
         open_slots = [s for s in base if s not in booked_set]
 
         if duration_min <= step:
             final = open_slots
         else:
             k = (duration_min + step - 1) // step
-            stitched: List[Tuple[str, str]] = []
-            for i in range(len(open_slots)):
-                blk = open_slots[i:i+k]
-                if len(blk) < k:
-                    break
-                if all(blk[j][1] == blk[j+1][0] for j in range(k-1)):
-                    stitched.append((blk[0][0], blk[-1][1]))
-            final = _dedupe(stitched)
+            final = _stitch(open_slots, k)
 
         return [{"doctor": doctor, "date": date_str, "start": s, "end": e} for (s, e) in final]
 
@@ -185,28 +298,37 @@ class CalendarService:
         if not SCHEDULES_XLSX.exists():
             return []
         try:
-            with ExcelFile(SCHEDULES_XLSX) as xf:
-                return [s for s in xf.sheet_names]
+            return list(self._schedule_sheets())
         except Exception:
             return []
 
-    def available_any(self, date_str: str, duration_min: int) -> list[dict]:
+    def available_any(self, date_str: str, duration_min: int, max_slots: Optional[int] = None) -> list[dict]:
         """
         Aggregate available slots across ALL doctors (all sheets in schedules.xlsx).
         If Excel has nothing, fall back to doctors.csv rows (if present).
+        With max_slots, stop scanning doctors once that many slots are found.
         """
         results: list[dict] = []
 
-        # 1) Try Excel sheets
-        for doctor in self.list_excel_doctors():
-            slots = self.available_from_excel(doctor, date_str, duration_min)
-            if slots:
-                results.extend(slots)
+        # 1) Try Excel sheets (workbook parsed once, not once per doctor)
+        sheets: Dict[str, pd.DataFrame] = {}
+        if SCHEDULES_XLSX.exists():
+            try:
+                sheets = self._schedule_sheets()
+            except Exception:
+                sheets = {}
+        # lazy, so a max_slots cap stops before the remaining sheets
+        per_doctor = (self.available_from_excel_df(df, doctor, date_str, duration_min)
+                      for doctor, df in sheets.items())
+        for slots in per_doctor:
+            results.extend(slots)
+            if max_slots and len(results) >= max_slots:
+                return results[:max_slots]
 
         # 2) If still empty, try CSV fallback for each doctor row
         if not results and DOCTORS_CSV.exists():
             try:
-                df = pd.read_csv(DOCTORS_CSV)
+                df = self._read_doctors()
                 for _, row in df.iterrows():
                     doctor = str(row.get("doctor") or "").strip()
                     if not doctor:
@@ -214,6 +336,8 @@ class CalendarService:
                     slots = self.available_from_csv(doctor, date_str, duration_min)
                     if slots:
                         results.extend(slots)
+                        if max_slots and len(results) >= max_slots:
+                            return results[:max_slots]
             except Exception:
                 pass
 
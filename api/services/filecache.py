@@ -0,0 +1,26 @@
+# api/services/filecache.py
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# (path, *key) -> ((mtime_ns, size), parsed value). A file is re-parsed only
+# when it changes on disk; callers must treat the returned value as read-only.
+_CACHE: Dict[Tuple[Hashable, ...], Tuple[Tuple[int, int], Any]] = {}
+
+def read_cached(path: Path, reader: Callable[[], T], *key: Hashable) -> T:
+    """
+    Return reader()'s result for `path`, reusing the previous parse while the
+    file's mtime and size are unchanged. Extra `key` parts distinguish several
+    parses of one file (e.g. one per sheet).
+    """
+    st = path.stat()
+    sig = (st.st_mtime_ns, st.st_size)
+    k = (str(path), *key)
+    hit = _CACHE.get(k)
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+    value = reader()
+    _CACHE[k] = (sig, value)
+    return value
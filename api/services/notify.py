@@ -3,10 +3,19 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Dict, Any, Iterable, Optional, List, Tuple
 import os
+import atexit
+import logging
+import queue
 import smtplib
+import threading
 import mimetypes
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.generator import BytesGenerator
 from email.message import EmailMessage
 from datetime import datetime
+from functools import lru_cache
+
+from .. import config  # noqa: F401  loads .env before SMTP_* are read
 
 # --- App config (read from environment) ---
 SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
@@ -19,14 +28,19 @@ OUTBOX_DIR    = Path(os.getenv("OUTBOX_DIR", "storage/outbox"))  # for .eml fall
 
 OUTBOX_DIR.mkdir(parents=True, exist_ok=True)
 
+logger = logging.getLogger("medical_api")
+
 
 # ---------------------------------------------------------------------
 # Utility: safe path finder for the Intake form the assignment provided
 # ---------------------------------------------------------------------
+@lru_cache(maxsize=1)
 def locate_intake_form() -> Optional[Path]:
     """
     Tries a few conventional locations/filenames for the intake form PDF.
     Returns a Path if found, else None.
+    Looked up once per process; call locate_intake_form.cache_clear() after
+    adding or moving the form.
     """
     candidates = [
         Path("assets/forms/intake_form.pdf"),
@@ -42,6 +56,132 @@ def locate_intake_form() -> Optional[Path]:
     return None
 
 
+# ---------------------------------------------------------------------
+# Pooled SMTP connections: the TCP + TLS + AUTH handshake is paid once per
+# connection instead of once per message. Config is process-wide, so one
+# pool serves every (host, port, user) this module ever talks to.
+# ---------------------------------------------------------------------
+_POOL_SIZE = 5
+_MAX_MSGS_PER_CONN = 100  # recycle long-lived sessions before servers cut them
+_POOL: "queue.LifoQueue[Tuple[smtplib.SMTP, int]]" = queue.LifoQueue(maxsize=_POOL_SIZE)
+
+def _connect_tls(pwd: str) -> smtplib.SMTP:
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT or 587, timeout=25)
+    try:
+        server.ehlo()
+        if SMTP_USE_TLS:
+            server.starttls()
+            server.ehlo()
+        server.login(SMTP_USERNAME, pwd)
+    except Exception:
+        _close_conn(server)
+        raise
+    return server
+
+def _connect_ssl(pwd: str) -> smtplib.SMTP:
+    server = smtplib.SMTP_SSL(SMTP_HOST, 465, timeout=25)
+    try:
+        server.login(SMTP_USERNAME, pwd)
+    except Exception:
+        _close_conn(server)
+        raise
+    return server
+
+def _close_conn(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+def _get_conn(connect) -> Tuple[smtplib.SMTP, int]:
+    """A live pooled connection (checked with NOOP), else a fresh one from connect()."""
+    while True:
+        try:
+            server, sent = _POOL.get_nowait()
+        except queue.Empty:
+            return connect(), 0
+        try:
+            if server.noop()[0] == 250:
+                return server, sent
+        except Exception:
+            pass
+        _close_conn(server)
+
+def _return_conn(server: smtplib.SMTP, sent: int) -> None:
+    if sent >= _MAX_MSGS_PER_CONN:
+        _close_conn(server)
+        return
+    try:
+        _POOL.put_nowait((server, sent))
+    except queue.Full:
+        _close_conn(server)
+
+def _send_pooled(msg: EmailMessage, to_addrs: List[str], connect) -> None:
+    server, sent = _get_conn(connect)
+    try:
+        server.send_message(msg, to_addrs=to_addrs)
+    except Exception:
+        _close_conn(server)  # session state unknown; never pool it again
+        raise
+    _return_conn(server, sent + 1)
+
+@atexit.register
+def _close_pool() -> None:
+    while True:
+        try:
+            server, _ = _POOL.get_nowait()
+        except queue.Empty:
+            return
+        _close_conn(server)
+
+
+# Prebuilt attachment parts (file read + MIME guess + base64 done once),
+# keyed by path and reused while (mtime_ns, size) is unchanged. The intake
+# form goes out with every confirmation; LRU order keeps it resident while
+# one-off confirmation PDFs age out.
+_ATTACH_CACHE: Dict[str, Tuple[Tuple[int, int], EmailMessage]] = {}
+_ATTACH_CACHE_MAX = 16
+_ATTACH_LOCK = threading.Lock()
+
+def _attachment_part(p: Path) -> EmailMessage:
+    st = p.stat()
+    sig = (st.st_mtime_ns, st.st_size)
+    key = str(p)
+    with _ATTACH_LOCK:
+        hit = _ATTACH_CACHE.pop(key, None)
+    if hit is not None and hit[0] == sig:
+        part = hit[1]
+    else:
+        ctype, _ = mimetypes.guess_type(p.name)
+        maintype, subtype = (ctype or "application/octet-stream").split("/", 1)
+        part = EmailMessage()
+        part.set_content(p.read_bytes(), maintype=maintype, subtype=subtype, filename=p.name)
+    with _ATTACH_LOCK:
+        while len(_ATTACH_CACHE) >= _ATTACH_CACHE_MAX:
+            _ATTACH_CACHE.pop(next(iter(_ATTACH_CACHE)))
+        _ATTACH_CACHE[key] = (sig, part)  # (re)insert as most recently used
+    return part
+
+def _attach_part(msg: EmailMessage, part: EmailMessage) -> None:
+    """add_attachment() for a prebuilt part; the part is only read, so it can be shared."""
+    if msg.get_content_type() != "multipart/mixed":
+        msg.make_mixed()
+    msg.attach(part)
+
+
+def _write_eml(msg: EmailMessage, error: str) -> Dict[str, str]:
+    """Drop an unsent message into the outbox; returns the send_email failure info."""
+    # microseconds in the name: concurrent background sends can fail in the same second
+    eml_path = OUTBOX_DIR / f"email_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.eml"
+    with open(eml_path, "wb") as f:
+        # stream into the file instead of building bytes(msg) in memory first
+        BytesGenerator(f, mangle_from_=False, policy=msg.policy).flatten(msg)
+    return {"eml_path": str(eml_path), "error": error}
+
+
 # -----------------------
 # Core SMTP send function
 # -----------------------
@@ -92,81 +232,50 @@ def send_email(
             p = Path(path)
             if not p.exists():
                 continue
-            ctype, _ = mimetypes.guess_type(p.name)
-            maintype, subtype = (ctype or "application/octet-stream").split("/", 1)
-            with open(p, "rb") as f:
-                msg.add_attachment(f.read(), maintype=maintype, subtype=subtype, filename=p.name)
+            _attach_part(msg, _attachment_part(p))
         except Exception:
             continue
 
     # If creds missing → write .eml and return
     if not (SMTP_USERNAME and pwd):
-        eml_path = OUTBOX_DIR / f"email_{datetime.now().strftime('%Y%m%d_%H%M%S')}.eml"
-        with open(eml_path, "wb") as f:
-            f.write(bytes(msg))
-        return (False, {"eml_path": str(eml_path), "error": "SMTP_USERNAME or SMTP_PASSWORD missing"})
+        return (False, _write_eml(msg, "SMTP_USERNAME or SMTP_PASSWORD missing"))
 
-    # --- attempt 1: TLS on 587 ---
+    # --- attempt 1: TLS on 587 (or a pooled session) ---
+    rcpts = to_list + cc_list + bcc_list
     try:
-        import smtplib
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT or 587, timeout=25) as server:
-            server.ehlo()
-            if SMTP_USE_TLS:
-                server.starttls()
-                server.ehlo()
-            server.login(SMTP_USERNAME, pwd)
-            server.send_message(msg, to_addrs=to_list + cc_list + bcc_list)
+        _send_pooled(msg, rcpts, lambda: _connect_tls(pwd))
         return (True, None)
     except Exception as e_tls:
         # --- attempt 2: SSL on 465 ---
         try:
-            import smtplib
-            with smtplib.SMTP_SSL(SMTP_HOST, 465, timeout=25) as server:
-                server.login(SMTP_USERNAME, pwd)
-                server.send_message(msg, to_addrs=to_list + cc_list + bcc_list)
+            _send_pooled(msg, rcpts, lambda: _connect_ssl(pwd))
             return (True, None)
         except Exception as e_ssl:
             # write .eml and return errors
-            eml_path = OUTBOX_DIR / f"email_{datetime.now().strftime('%Y%m%d_%H%M%S')}.eml"
-            with open(eml_path, "wb") as f:
-                f.write(bytes(msg))
-            return (False, {
-                "eml_path": str(eml_path),
-                "error": f"TLS failed: {e_tls.__class__.__name__}: {e_tls}; SSL failed: {e_ssl.__class__.__name__}: {e_ssl}"
-            })
+            return (False, _write_eml(
+                msg,
+                f"TLS failed: {e_tls.__class__.__name__}: {e_tls}; SSL failed: {e_ssl.__class__.__name__}: {e_ssl}",
+            ))
+
 
 # ---------------------------------------------------
 # High-level confirmation email tailored for booking
 # ---------------------------------------------------
-def _build_confirmation_bodies(data: Dict[str, Any]) -> tuple[str, str]:
-    name = data.get("name") or "Patient"
-    doctor = data.get("doctor") or "Doctor"
-    date = data.get("appointment_date") or ""
-    s = data.get("appointment_start") or ""
-    e = data.get("appointment_end") or ""
-    booking_id = data.get("booking_id") or ""
-    duration = data.get("appointment_duration_min") or ""
-    problem = data.get("problem") or ""
-    phone = data.get("phone") or ""
-    email = data.get("email") or ""
-
-    when = f"{date}"
-    if s and e:
-        when = f"{date}, {s}–{e}"
-
-    text = (
-        f"Hi {name},\n\n"
-        f"Your appointment is confirmed with {doctor} on {when}.\n"
-        f"Booking ID: {booking_id}\n"
-        f"Duration: {duration} minutes\n"
-        f"Reason: {problem}\n\n"
-        "Please find attached your Appointment Confirmation and the Intake Form.\n"
-        "Kindly complete the intake form and bring it to your visit (or submit online if available).\n\n"
-        "If you need to reschedule, reply to this email.\n\n"
-        "— Clinic Team\n"
-    )
-
-    html = f"""
+# Bodies are plain format strings parsed once at import; a confirmation only
+# fills in the fields.
+_CONFIRMATION_TEXT = (
+    "Hi {name},\n\n"
+    "Your appointment is confirmed with {doctor} on {when}.\n"
+    "Booking ID: {booking_id}\n"
+    "Duration: {duration} minutes\n"
+    "Reason: {problem}\n\n"
+    "Please find attached your Appointment Confirmation and the Intake Form.\n"
+    "Kindly complete the intake form and bring it to your visit (or submit online if available).\n\n"
+    "If you need to reschedule, reply to this email.\n\n"
+    "— Clinic Team\n"
+)
+
+_CONFIRMATION_HTML = """
     <html>
       <body style="font-family:Arial,Helvetica,sans-serif;line-height:1.5">
         <h2>Appointment Confirmed</h2>
@@ -186,7 +295,45 @@ def _build_confirmation_bodies(data: Dict[str, Any]) -> tuple[str, str]:
       </body>
     </html>
     """
-    return text, html
+
+
+def _build_confirmation_bodies(data: Dict[str, Any]) -> tuple[str, str]:
+    s = data.get("appointment_start") or ""
+    e = data.get("appointment_end") or ""
+    date = data.get("appointment_date") or ""
+    fields = {
+        "name": data.get("name") or "Patient",
+        "doctor": data.get("doctor") or "Doctor",
+        "when": f"{date}, {s}–{e}" if s and e else f"{date}",
+        "booking_id": data.get("booking_id") or "",
+        "duration": data.get("appointment_duration_min") or "",
+        "problem": data.get("problem") or "",
+        "phone": data.get("phone") or "",
+        "email": data.get("email") or "",
+    }
+    return _CONFIRMATION_TEXT.format_map(fields), _CONFIRMATION_HTML.format_map(fields)
+
+
+def booking_confirmation_message(data: Dict[str, Any], email_queued: bool = False) -> str:
+    """
+    Chat-facing confirmation shown after a booking, shared by the agent's
+    booking node and /appointments/book. Empty fields are left out.
+    """
+    lines = ["Your appointment has been confirmed!"]
+    if email_queued:
+        lines[0] += " A confirmation email is on its way."
+    lines.append("")
+    s = data.get("appointment_start") or ""
+    e = data.get("appointment_end") or ""
+    for label, value in (
+        ("Doctor", data.get("doctor")),
+        ("Date",   data.get("appointment_date")),
+        ("Time",   f"{s} – {e}" if s and e else s),
+        ("Reason", data.get("problem")),
+    ):
+        if value:
+            lines.append(f"{label + ':':<7} {value}")
+    return "\n".join(lines)
 
 
 def send_confirmation_email(
@@ -219,6 +366,34 @@ def send_confirmation_email(
     return send_email(to=to, subject=subject, text_body=text, html_body=html, attachments=att, cc=cc, bcc=bcc)
 
 
+# Fire-and-forget sends run here, so callers that don't need the result
+# (agent nodes) never wait on SMTP round-trips.
+_SEND_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="smtp")
+
+def send_confirmation_email_later(
+    to: str,
+    data: Dict[str, Any],
+    attachments: Optional[Iterable[Path]] = None,
+) -> Future:
+    """
+    Queues send_confirmation_email on a background thread and returns at once.
+    The Future resolves to the usual (success, info) tuple; failures are
+    logged even when the caller drops it.
+    """
+    fut = _SEND_EXECUTOR.submit(send_confirmation_email, to, data, attachments)
+    fut.add_done_callback(_log_send_outcome)
+    return fut
+
+def _log_send_outcome(fut: Future) -> None:
+    exc = fut.exception()
+    if exc is not None:
+        logger.error("confirmation email failed", exc_info=exc)
+        return
+    ok, info = fut.result()
+    if not ok:
+        logger.warning("confirmation email not sent: %s", info)
+
+
 # -----------------------------------------------------------------
 # Existing logger kept for backward-compat (no-ops ok in your app)
 # -----------------------------------------------------------------
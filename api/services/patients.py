@@ -1,46 +1,104 @@
 from __future__ import annotations
+import csv
+import sqlite3
+import threading
 from dataclasses import dataclass
-import pandas as pd
-from typing import Dict
-from api.config import PATIENTS_CSV
+from typing import Dict, Optional
+from api.config import PATIENTS_CSV, PATIENTS_DB
+
+PATIENT_COLS = ["name", "dob", "email", "phone", "insurance_carrier", "insurance_member_id", "insurance_group"]
+
+# Patient master in SQLite: matching a booking is an index probe and an
+# upsert touches one row, instead of scanning and rewriting patients.csv.
+# email_key / name_key hold the lowercased match keys.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    id                  INTEGER PRIMARY KEY,
+    name                TEXT NOT NULL DEFAULT '',
+    dob                 TEXT NOT NULL DEFAULT '',
+    email               TEXT NOT NULL DEFAULT '',
+    phone               TEXT NOT NULL DEFAULT '',
+    insurance_carrier   TEXT NOT NULL DEFAULT '',
+    insurance_member_id TEXT NOT NULL DEFAULT '',
+    insurance_group     TEXT NOT NULL DEFAULT '',
+    email_key           TEXT NOT NULL DEFAULT '',
+    name_key            TEXT NOT NULL DEFAULT ''
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_patients_email ON patients(email_key) WHERE email_key <> '';
+CREATE INDEX IF NOT EXISTS ix_patients_name_dob ON patients(name_key, dob);
+"""
+
+# only non-empty incoming values overwrite what is stored
+_KEEP_UNLESS_GIVEN = ", ".join(
+    f"{c} = CASE WHEN excluded.{c} <> '' THEN excluded.{c} ELSE {c} END"
+    for c in PATIENT_COLS + ["name_key"]
+)
+_INSERT = (
+    f"INSERT INTO patients ({', '.join(PATIENT_COLS)}, email_key, name_key) "
+    f"VALUES ({', '.join(':' + c for c in PATIENT_COLS)}, :email_key, :name_key)"
+)
+_UPSERT_BY_EMAIL = (
+    f"{_INSERT} ON CONFLICT(email_key) WHERE email_key <> '' DO UPDATE SET {_KEEP_UNLESS_GIVEN}"
+)
+_UPDATE_BY_NAME_DOB = (
+    "UPDATE patients SET "
+    + ", ".join(f"{c} = CASE WHEN :{c} <> '' THEN :{c} ELSE {c} END" for c in PATIENT_COLS)
+    + ", email_key = CASE WHEN :email_key <> '' THEN :email_key ELSE email_key END"
+    + " WHERE name_key = :name_key AND dob = :dob"
+)
+
+_CONN: Optional[sqlite3.Connection] = None
+_CONN_LOCK = threading.Lock()
+
+def _params(basic: Dict[str, str]) -> Dict[str, str]:
+    return {**basic, "email_key": basic["email"].lower(), "name_key": basic["name"].lower()}
+
+def _upsert(conn: sqlite3.Connection, basic: Dict[str, str]) -> None:
+    # match by email if present, else by (name+dob)
+    params = _params(basic)
+    if basic["email"]:
+        conn.execute(_UPSERT_BY_EMAIL, params)
+    elif basic["name"] and basic["dob"]:
+        if conn.execute(_UPDATE_BY_NAME_DOB, params).rowcount == 0:
+            conn.execute(_INSERT, params)
+    else:
+        conn.execute(_INSERT, params)
+
+def _seed_from_csv(conn: sqlite3.Connection) -> None:
+    """One-time migration: earlier versions kept the patient master in patients.csv."""
+    with open(PATIENTS_CSV, newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            _upsert(conn, {c: r.get(c) or "" for c in PATIENT_COLS})
+
+def _get_conn() -> sqlite3.Connection:
+    """One shared connection per process; callers serialize on _CONN_LOCK."""
+    global _CONN
+    if _CONN is None:
+        fresh = not PATIENTS_DB.exists()
+        conn = sqlite3.connect(PATIENTS_DB, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.executescript(_SCHEMA)
+            if fresh and PATIENTS_CSV.exists():
+                _seed_from_csv(conn)
+        _CONN = conn
+    return _CONN
 
 @dataclass
 class PatientsService:
     def upsert_from_booking(self, payload: Dict) -> None:
         basic = {
-            "name": payload.get("name", ""),
-            "dob": payload.get("dob", ""),
-            "email": payload.get("email", ""),
-            "phone": payload.get("phone", ""),
-            "insurance_carrier": payload.get("insurance_carrier", ""),
-            "insurance_member_id": payload.get("member_id", "") or payload.get("insurance_member_id", ""),
-            "insurance_group": payload.get("group", "") or payload.get("insurance_group", ""),
+            "name": payload.get("name", "") or "",
+            "dob": payload.get("dob", "") or "",
+            "email": payload.get("email", "") or "",
+            "phone": payload.get("phone", "") or "",
+            "insurance_carrier": payload.get("insurance_carrier", "") or "",
+            "insurance_member_id": payload.get("member_id", "") or payload.get("insurance_member_id", "") or "",
+            "insurance_group": payload.get("group", "") or payload.get("insurance_group", "") or "",
         }
-        cols = ["name", "dob", "email", "phone", "insurance_carrier", "insurance_member_id", "insurance_group"]
-
-        if PATIENTS_CSV.exists():
-            dfp = pd.read_csv(PATIENTS_CSV)
-            for c in cols:
-                if c not in dfp.columns:
-                    dfp[c] = ""
-        else:
-            dfp = pd.DataFrame(columns=cols)
-
-        # match by email if present, else by (name+dob)
-        import pandas as pd
-        mask = pd.Series([False] * len(dfp))
-        if basic["email"]:
-            mask = dfp["email"].fillna("").str.lower() == basic["email"].lower()
-        elif basic["name"] and basic["dob"]:
-            mask = (dfp["name"].fillna("").str.lower() == basic["name"].lower()) & (
-                dfp["dob"].fillna("").astype(str) == basic["dob"]
-            )
-
-        if mask.any():
-            for k, v in basic.items():
-                if v:
-                    dfp.loc[mask, k] = v
-        else:
-            dfp = pd.concat([dfp, pd.DataFrame([basic])], ignore_index=True)
-
-        dfp.to_csv(PATIENTS_CSV, index=False)
+        basic = {k: str(v) for k, v in basic.items()}
+
+        with _CONN_LOCK:
+            conn = _get_conn()
+            with conn:
+                _upsert(conn, basic)
@@ -1,8 +1,17 @@
 from __future__ import annotations
+import csv
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-import pandas as pd
-from api.config import REMINDERS_XLSX
+from api.config import REMINDERS_CSV, REMINDERS_XLSX
+
+REMINDER_COLS = ["send_at", "to", "message", "appointment_iso"]
+
+def _seed_csv_from_xlsx() -> None:
+    """One-time migration: older installs kept reminders only in the xlsx."""
+    if REMINDERS_CSV.exists() or not REMINDERS_XLSX.exists():
+        return
+    import pandas as pd
+    pd.read_excel(REMINDERS_XLSX).to_csv(REMINDERS_CSV, index=False)
 
 @dataclass
 class ReminderService:
@@ -22,10 +31,17 @@ class ReminderService:
                 "message": m,
                 "appointment_iso": appointment_iso,
             })
-        if REMINDERS_XLSX.exists():
-            prev = pd.read_excel(REMINDERS_XLSX)
-            out = pd.concat([prev, pd.DataFrame(rows)], ignore_index=True)
-        else:
-            out = pd.DataFrame(rows)
-        out.to_excel(REMINDERS_XLSX, index=False)
+
+        # append-only: cost stays flat no matter how many reminders exist
+        _seed_csv_from_xlsx()
+        cols = REMINDER_COLS
+        new_file = not REMINDERS_CSV.exists() or not REMINDERS_CSV.stat().st_size
+        if not new_file:
+            with open(REMINDERS_CSV, newline="", encoding="utf-8") as f:
+                cols = next(csv.reader(f), None) or REMINDER_COLS
+        with open(REMINDERS_CSV, "a", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
+            if new_file:
+                w.writeheader()
+            w.writerows(rows)
         return len(rows)
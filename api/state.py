@@ -1,45 +1,147 @@
 # api/state.py
 from __future__ import annotations
 
+import json
+import os
+import threading
 import time
-from typing import Any, Dict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator
 
-# TODO (production / Issue 1 — SESSION_STORE volatility):
-#   In-memory dict is perfectly fine for local development.
-#   For production you MUST replace this with an external store:
-#
-#   Option A — Redis (recommended for AWS/cloud):
-#     import redis, json
-#     r = redis.Redis.from_url(os.environ["REDIS_URL"])
-#     # wrap get/set with json.dumps/loads + TTL
-#
-#   Option B — PostgreSQL conversations table:
-#     Store {thread_id, patient_json, next_step, booking_done}
-#     via SQLAlchemy, one row per active session.
+from cachetools import TTLCache
+
+from . import config  # noqa: F401  loads .env before REDIS_URL/SESSION_* are read
+
+# Session storage.
+#   • REDIS_URL unset → an in-process TTLCache (local development; lost on
+#     restart/reload, and each worker process has its own), capped at
+#     SESSION_MAX_ENTRIES so memory can't grow without bound.
+#   • REDIS_URL set   → RedisSessionStore: one JSON value per thread_id with
+#     a key TTL, shared by every worker/pod and surviving restarts
+#     (needs `pip install redis`).
 #
-#   Symptoms of not fixing this in prod:
-#     • server restart → all sessions lost, users restart mid-flow
-#     • multi-instance (auto-scaling) → each pod has its own dict,
-#       load balancer sends user to different pod → session gone
-#     • reload=True (dev mode) → resets between hot-reloads
+#   Callers treat SESSION_STORE as a mapping and must write a modified
+#   session back (SESSION_STORE[tid] = sess): with Redis, a fetched session
+#   is a copy.
 #
 # TODO (production / Issue 7 — conversation history):
 #   SESSION_STORE only tracks current slot state, not the full message
 #   log.  For analytics, AI memory, and audit trails, persist each
 #   (thread_id, role, content, timestamp) turn to a conversations table.
 
-# Global in-memory conversation/session storage — DEV ONLY
-SESSION_STORE: Dict[str, Dict[str, Any]] = {}
-
 # Session TTL in seconds — inactive sessions older than this are pruned.
 # 4 hours is generous enough for a single appointment booking flow.
 SESSION_TTL_SECONDS: int = 4 * 60 * 60  # 4 hours
 
+# In-process store only: least-recently-used sessions are evicted past this.
+SESSION_MAX_ENTRIES: int = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+
+
+def _encode_value(o: Any) -> Any:
+    dump = getattr(o, "model_dump", None)  # PatientIntake
+    if callable(dump):
+        return dump(mode="json")
+    raise TypeError(f"unserializable session value: {type(o).__name__}")
+
+
+class RedisSessionStore(MutableMapping):
+    """SESSION_STORE backed by Redis; expiry is the key TTL, refreshed on every write."""
+
+    def __init__(self, url: str, ttl_seconds: int, prefix: str = "session:") -> None:
+        import redis  # optional dependency, only needed when REDIS_URL is set
+
+        self._r = redis.Redis.from_url(url)
+        self._ttl = ttl_seconds
+        self._prefix = prefix
+
+    def _key(self, thread_id: str) -> str:
+        return self._prefix + thread_id
+
+    def __getitem__(self, thread_id: str) -> Dict[str, Any]:
+        raw = self._r.get(self._key(thread_id))
+        if raw is None:
+            raise KeyError(thread_id)
+        sess = json.loads(raw)
+        if isinstance(sess.get("patient"), dict):
+            from agents.schema import PatientIntake
+            sess["patient"] = PatientIntake(**sess["patient"])
+        return sess
+
+    def __setitem__(self, thread_id: str, sess: Dict[str, Any]) -> None:
+        self._r.set(self._key(thread_id), json.dumps(sess, default=_encode_value), ex=self._ttl)
+
+    def __delitem__(self, thread_id: str) -> None:
+        if not self._r.delete(self._key(thread_id)):
+            raise KeyError(thread_id)
+
+    def __contains__(self, thread_id: object) -> bool:
+        return isinstance(thread_id, str) and bool(self._r.exists(self._key(thread_id)))
+
+    def __iter__(self) -> Iterator[str]:
+        n = len(self._prefix)
+        for k in self._r.scan_iter(match=self._prefix + "*"):
+            yield k.decode()[n:]
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._r.scan_iter(match=self._prefix + "*"))
+
+    def touch(self, thread_id: str) -> None:
+        self._r.expire(self._key(thread_id), self._ttl)
+
+
+class _SessionCache(TTLCache):
+    """
+    TTLCache guarded by a lock: sync routes run in the threadpool, and
+    TTLCache's internal links are not thread-safe. Expiry restarts on every
+    write, so writing a session back keeps it alive.
+    """
+
+    def __init__(self, maxsize: int, ttl: int) -> None:
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            return super().__getitem__(key)
+
+    def __setitem__(self, key, value) -> None:
+        with self._lock:
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key) -> None:
+        with self._lock:
+            super().__delitem__(key)
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            return super().setdefault(key, default)
+
+    def pop(self, key, *args):
+        with self._lock:
+            return super().pop(key, *args)
+
+    def expire(self, time=None):
+        with self._lock:
+            return super().expire(time)
+
+
+# Global conversation/session storage
+SESSION_STORE: MutableMapping[str, Dict[str, Any]] = (
+    RedisSessionStore(os.environ["REDIS_URL"], SESSION_TTL_SECONDS)
+    if os.getenv("REDIS_URL")
+    else _SessionCache(SESSION_MAX_ENTRIES, SESSION_TTL_SECONDS)
+)
+
 
 def touch_session(thread_id: str) -> None:
     """Update the last-active timestamp for a session."""
-    if thread_id in SESSION_STORE:
-        SESSION_STORE[thread_id]["_last_active"] = time.monotonic()
+    if isinstance(SESSION_STORE, RedisSessionStore):
+        SESSION_STORE.touch(thread_id)
+        return
+    sess = SESSION_STORE.get(thread_id)
+    if sess is not None:
+        sess["_last_active"] = time.monotonic()
+        SESSION_STORE[thread_id] = sess  # re-set restarts the TTL
 
 
 def purge_expired_sessions() -> int:
@@ -47,17 +149,10 @@ def purge_expired_sessions() -> int:
     Remove sessions that have been inactive for longer than SESSION_TTL_SECONDS.
 
     Returns the number of sessions removed.
-    Called periodically by the lifespan cleanup task.
-
-    TODO (production / Issue 2): replace with Redis TTL keys so expiry is
-    automatic and works across multiple server instances.
+    Called periodically by the lifespan cleanup task. A no-op with Redis,
+    where keys expire on their own; the TTLCache also drops stale entries
+    lazily, this just frees their memory without waiting for a lookup.
     """
-    now = time.monotonic()
-    expired = [
-        tid
-        for tid, sess in SESSION_STORE.items()
-        if now - sess.get("_last_active", 0) > SESSION_TTL_SECONDS
-    ]
-    for tid in expired:
-        SESSION_STORE.pop(tid, None)
-    return len(expired)
\ No newline at end of file
+    if isinstance(SESSION_STORE, RedisSessionStore):
+        return 0
+    return len(SESSION_STORE.expire())
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import socket
+from functools import lru_cache
 from typing import Any, Dict
 from agents import PatientIntake
 
@@ -23,7 +24,9 @@ def patient_to_dict(p: PatientIntake | Dict[str, Any] | None) -> Dict[str, Any]:
 def dict_to_patient(d: Dict[str, Any] | None) -> PatientIntake:
     return PatientIntake(**(d or {}))
 
+@lru_cache(maxsize=1)
 def get_ip_address() -> str:
+    """LAN address of this host (127.0.0.1 if unknown); probed once per process."""
     try:
         import socket as _s
         s = _s.socket(_s.AF_INET, _s.SOCK_DGRAM)
@@ -49,4 +52,5 @@ def set_booking_done(thread_id: str) -> None:
     Mark the thread as having completed a booking. Insurance node runs after this.
     """
     s = ensure_session(thread_id)
-    s["booking_done"] = True
\ No newline at end of file
+    s["booking_done"] = True
+    SESSION_STORE[thread_id] = s  # write back: a Redis-backed session is a copy
\ No newline at end of file
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
 import asyncio
+import atexit
 import logging
 import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 
 from fastapi import (
     FastAPI,
@@ -12,7 +16,9 @@ from fastapi import (
     status,
 )
 
+import orjson
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, field_validator
 
 from agents import (
@@ -51,9 +57,38 @@ logging.basicConfig(
     format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
     datefmt="%Y-%m-%dT%H:%M:%S",
 )
+
+# Handlers only enqueue records; the blocking stderr write happens on the
+# listener thread, so a slow console or pipe can't stall the event loop.
+# QueueHandler.prepare() still merges msg % args and formats any traceback
+# in the calling thread; only the I/O moves off the caller.
+# `python fastapi_app.py` imports this module twice (__main__, then
+# "fastapi_app" via uvicorn); install the queue only once per process.
+_root_logger = logging.getLogger()
+if not any(isinstance(h, QueueHandler) for h in _root_logger.handlers):
+    _log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _log_listener = QueueListener(
+        _log_queue, *_root_logger.handlers, respect_handler_level=True
+    )
+    _root_logger.handlers = [QueueHandler(_log_queue)]
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
 logger = logging.getLogger("medical_api")
 
 
+# =========================================================
+# AGENT EXECUTOR
+# =========================================================
+
+# intake_graph.invoke is synchronous and waits on the LLM; it runs here so
+# /chat never blocks the event loop. Size it to expected concurrent chats.
+_GRAPH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("GRAPH_WORKERS", "16")),
+    thread_name_prefix="intake-graph",
+)
+
+
 # =========================================================
 # BACKGROUND TASK — session cleanup
 # =========================================================
@@ -68,8 +103,8 @@ async def _session_cleanup_loop() -> None:
     SESSION_TTL_SECONDS (4 hours).  Runs as a background asyncio task
     for the lifetime of the server process.
 
-    TODO (production / Issue 2): remove this coroutine once SESSION_STORE
-    is replaced with Redis — TTL expiry will be handled by Redis itself.
+    With REDIS_URL set, purge_expired_sessions() is a no-op: Redis expires
+    session keys itself.
     """
     while True:
         await asyncio.sleep(_CLEANUP_INTERVAL_SECONDS)
@@ -91,6 +126,10 @@ async def lifespan(app: FastAPI):
         logger.info("  %-10s %s", methods, route.path)
     logger.info("================")
 
+    # Warm the LLM connection in the background (needs OPENAI_API_KEY)
+    from agents.llm import prewarm_http_client
+    asyncio.get_running_loop().run_in_executor(None, prewarm_http_client)
+
     # Start the session-cleanup background task
     cleanup_task = asyncio.create_task(_session_cleanup_loop())
     logger.info("Session cleanup task started (interval=%ds).", _CLEANUP_INTERVAL_SECONDS)
@@ -98,6 +137,7 @@ async def lifespan(app: FastAPI):
     yield
 
     # ── shutdown ─────────────────────────────────────────
+    _GRAPH_EXECUTOR.shutdown(wait=False, cancel_futures=True)
     cleanup_task.cancel()
     try:
         await cleanup_task
@@ -110,9 +150,17 @@ async def lifespan(app: FastAPI):
 # FASTAPI APP
 # =========================================================
 
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (C encoder) instead of stdlib json."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
 app = FastAPI(
     title="AI Medical Scheduling API",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -120,14 +168,24 @@ app = FastAPI(
 # CORS
 # =========================================================
 
-# TODO (production / Issue 3):
-#   Replace allow_origins=["*"] with the exact frontend domain, e.g.:
-#     allow_origins=["https://your-app.vercel.app"]
-#   Wide-open CORS is fine for local development only.
+# Explicit allowlist (comma-separated CORS_ALLOW_ORIGINS); defaults cover the
+# Vite dev server and Streamlit. Deployments set their frontend domain, e.g.
+#   CORS_ALLOW_ORIGINS=https://your-app.vercel.app
+# The frontend authenticates with a Bearer header, not cookies, so
+# credentials stay off.
+CORS_ALLOW_ORIGINS = [
+    o.strip()
+    for o in os.getenv(
+        "CORS_ALLOW_ORIGINS",
+        "http://localhost:5173,http://127.0.0.1:5173,http://localhost:8501",
+    ).split(",")
+    if o.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # DEV ONLY — tighten before deploying
-    allow_credentials=True,
+    allow_origins=CORS_ALLOW_ORIGINS,
+    allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -230,14 +288,6 @@ async def chat(
     #   will corrupt the existing session.  Acceptable for MVP.
     thread_id = (body.thread_id or "").strip() or f"user-{user_id}"
 
-    logger.info(
-        "chat | user_id=%s thread_id=%s step=%s slot_id=%s",
-        user_id,
-        thread_id,
-        None,  # will be logged after session load
-        body.selected_slot_id,
-    )
-
     # ----------------------------------------------------------
     # SESSION
     # ----------------------------------------------------------
@@ -259,9 +309,11 @@ async def chat(
     current_step = session.get("next_step")
 
     logger.info(
-        "chat | thread_id=%s current_step=%s",
+        "chat | user_id=%s thread_id=%s step=%s slot_id=%s",
+        user_id,
         thread_id,
         current_step,
+        body.selected_slot_id,
     )
 
     # ----------------------------------------------------------
@@ -286,7 +338,9 @@ async def chat(
     # ----------------------------------------------------------
 
     try:
-        result = intake_graph.invoke(state)
+        result = await asyncio.get_running_loop().run_in_executor(
+            _GRAPH_EXECUTOR, intake_graph.invoke, state
+        )
 
     except Exception as exc:
         logger.exception(
@@ -318,6 +372,7 @@ async def chat(
 
     new_step = result.get("next_step")
     session["next_step"] = new_step
+    SESSION_STORE[thread_id] = session  # write back (Redis hands out copies)
 
     logger.info(
         "chat | thread_id=%s next_step=%s appointment_id=%s",
@@ -376,9 +431,21 @@ if __name__ == "__main__":
     logger.info("Network URL: http://%s:%d", get_ip_address(), port)
     logger.info("API Docs:    http://%s:%d/docs", get_ip_address(), port)
 
+    # DEV=1: single auto-reloading process. Otherwise WEB_CONCURRENCY
+    # workers, default 1. More than one worker needs REDIS_URL (the in-process
+    # SESSION_STORE is per worker) AND a single writer for the file-backed
+    # stores: bookings.csv / bookings.xlsx and reminders.csv are only locked
+    # within one process, so concurrent workers can interleave or lose rows.
+    dev = os.getenv("DEV") == "1"
+    workers = 1 if dev else int(os.getenv("WEB_CONCURRENCY", "1"))
+
+    # uvicorn's default loop/http ("auto") already use uvloop and httptools
+    # when they are installed (httptools is pinned in requirements.txt).
     uvicorn.run(
-    "fastapi_app:app",
-    host="0.0.0.0",
-    port=5000,
-    reload=False,
-)
\ No newline at end of file
+        "fastapi_app:app",
+        host=host_ip,
+        port=port,
+        reload=dev,
+        workers=workers,
+        access_log=dev,
+    )
\ No newline at end of file
@@ -5,7 +5,8 @@ import os
 import uuid
 from typing import Dict, Any, List
 
-import requests
+import httpx
+import orjson
 import streamlit as st
 
 
@@ -59,7 +60,12 @@ if "next_step" not in st.session_state:
 # SIDEBAR
 # =========================================================
 
-with st.sidebar:
+@st.fragment
+def render_sidebar() -> None:
+    """
+    Runs as a fragment: typing a token reruns only the sidebar, not the
+    whole chat history.
+    """
 
     st.header("🔐 Authentication")
 
@@ -89,11 +95,41 @@ with st.sidebar:
         st.rerun()
 
 
+with st.sidebar:
+    render_sidebar()
+
+
 # =========================================================
 # HELPERS
 # =========================================================
 
 
+@st.cache_resource
+def get_http_client() -> httpx.Client:
+    """
+    One keep-alive client shared across reruns, so back-to-back API calls
+    reuse the TCP (and TLS) connection instead of reconnecting each time.
+    Against an https FASTAPI_URL served over HTTP/2 (e.g. behind a TLS
+    proxy), concurrent requests multiplex on that one connection.
+    """
+
+    transport = httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=16,
+            max_keepalive_connections=8,
+        ),
+        retries=2,  # connect failures only
+    )
+
+    return httpx.Client(
+        base_url=FASTAPI_URL,
+        transport=transport,
+        timeout=60,
+    )
+
+
+
 def get_headers() -> Dict[str, str]:
 
     token = st.session_state.get(
@@ -131,8 +167,8 @@ def call_chat(
             "selected_slot_id"
         ] = selected_slot_id
 
-    response = requests.post(
-        f"{FASTAPI_URL}/chat",
+    response = get_http_client().post(
+        "/chat",
         json=payload,
         headers=get_headers(),
         timeout=60,
@@ -140,7 +176,7 @@ def call_chat(
 
     response.raise_for_status()
 
-    return response.json()
+    return orjson.loads(response.content)
 
 
 # =========================================================
@@ -216,75 +252,85 @@ if prompt:
 # SLOT SELECTION UI
 # =========================================================
 
-slots: List[Dict[str, Any]] = (
-    st.session_state.get(
-        "available_slots",
-        []
+@st.fragment
+def render_slots() -> None:
+    """
+    Runs as a fragment, so a failed Book click reruns only this section;
+    a successful one reruns the app to show the confirmation.
+    """
+
+    slots: List[Dict[str, Any]] = (
+        st.session_state.get(
+            "available_slots",
+            []
+        )
     )
-)
 
-if slots:
+    if slots:
 
-    st.divider()
+        st.divider()
 
-    st.subheader("🗓️ Available Slots")
+        st.subheader("🗓️ Available Slots")
 
-    for slot in slots:
+        for slot in slots:
 
-        slot_id = slot["slot_id"]
+            slot_id = slot["slot_id"]
 
-        label = (
-            f"{slot['start']} → {slot['end']}"
-        )
+            label = (
+                f"{slot['start']} → {slot['end']}"
+            )
+
+            col1, col2 = st.columns([5, 1])
+
+            with col1:
+                st.markdown(label)
 
-        col1, col2 = st.columns([5, 1])
+            with col2:
 
-        with col1:
-            st.markdown(label)
+                if st.button(
+                    "Book",
+                    key=f"slot_{slot_id}"
+                ):
 
-        with col2:
+                    try:
 
-            if st.button(
-                "Book",
-                key=f"slot_{slot_id}"
-            ):
+                        data = call_chat(
+                            message="book this slot",
+                            selected_slot_id=slot_id,
+                        )
 
-                try:
+                        confirmation = data.get(
+                            "message",
+                            "Appointment booked."
+                        )
 
-                    data = call_chat(
-                        message="book this slot",
-                        selected_slot_id=slot_id,
-                    )
+                        st.session_state[
+                            "messages"
+                        ].append(
+                            {
+                                "role": "assistant",
+                                "content": confirmation,
+                            }
+                        )
 
-                    confirmation = data.get(
-                        "message",
-                        "Appointment booked."
-                    )
+                        st.session_state[
+                            "available_slots"
+                        ] = []
 
-                    st.session_state[
-                        "messages"
-                    ].append(
-                        {
-                            "role": "assistant",
-                            "content": confirmation,
-                        }
-                    )
+                        st.session_state[
+                            "next_step"
+                        ] = "done"
 
-                    st.session_state[
-                        "available_slots"
-                    ] = []
+                        st.rerun()
 
-                    st.session_state[
-                        "next_step"
-                    ] = "done"
+                    except Exception as e:
 
-                    st.rerun()
+                        st.error(
+                            f"Booking failed: {e}"
+                        )
 
-                except Exception as e:
 
-                    st.error(
-                        f"Booking failed: {e}"
-                    )
+render_slots()
 
 
 # =========================================================